@@ -4,30 +4,78 @@
 # In[ ]:
 
 
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import networkx as nx
-from typing import List
+from typing import List, Optional, Tuple, Union
 from models import Client, Product, Order
-from datetime import datetime
-from collections import Counter
+from db import (Database, ORDER_LINE_COLUMNS, ORDER_LINES_CHUNK_SIZE, AGGREGATES_SCHEMA, read_order_lines,
+                read_client_product_pairs)
+from cache import memoized
+from datetime import datetime, timedelta
+from collections import Counter, OrderedDict
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from pandas.api.types import union_categoricals
 
 sns.set(style="whitegrid")
 
+# Типы столбцов таблицы позиций заказов, построенной из SQL
+ORDER_LINE_DTYPES = {
+    "order_id": "int32",
+    "client_id": "int32",
+    "product_id": "int32",
+    "price": "float32",
+    "quantity": "int32",
+    "client_name": "category",
+    "product_name": "category",
+    "status": "category",
+}
+
+OrdersData = Union[List[Order], pd.DataFrame]
+# Источник для сводной аналитики: данные заказов или база со сводными таблицами
+AnalyticsSource = Union[OrdersData, Database]
+
+GRAPH_CHUNK_PAIRS = 5_000_000  # пар клиентов, накапливаемых до свёртки в счётчики
+LARGE_GRAPH_NODES = 300  # с какого числа клиентов граф рисуется группами
+MAX_GRAPH_GROUPS = 200  # наибольшее число супер-узлов на рисунке
+LAYOUT_CACHE_SIZE = 8
+PARALLEL_WORKERS = os.cpu_count() or 1  # процессов для parallel_order_stats и parallel_co_purchase_edges
+# Способы разбиения для order_partitions: таблица и столбец диапазона, столбец в запросе
+PARTITION_COLUMNS = {
+    "date": ("orders", "date", "o.date"),
+    "client": ("orders", "client_id", "o.client_id"),
+    "product": ("order_products", "product_id", "op.product_id"),
+}
+# Порядок позиций в части: по индексу, которым выбирается часть (позиции заказа идут подряд)
+PARTITION_ORDER_BY = {
+    "date": "o.date, o.order_id",  # idx_orders_date
+    "client": "o.client_id, o.order_id",  # idx_orders_client_id
+}
+
+_layout_cache = OrderedDict()  # отпечаток графа -> расположение узлов
+_layout_cache_lock = threading.Lock()  # граф строится в рабочих потоках TaskRunner
+
 
 def orders_to_dataframe(orders: List[Order]) -> pd.DataFrame:
     """Преобразует список заказов в DataFrame для анализа."""
     records = []
     for order in orders:
-        for product in order.products:
+        for item in order.items:
             records.append({
                 "order_id": order.order_id,
                 "client_id": order.client.client_id,
                 "client_name": order.client.name,
-                "product_id": product.product_id,
-                "product_name": product.name,
-                "price": product.price,
+                "product_id": item.product.product_id,
+                "product_name": item.product.name,
+                "price": item.unit_price,
+                "quantity": item.quantity,
                 "date": order.date,
                 "status": order.status
             })
@@ -35,12 +83,248 @@ def orders_to_dataframe(orders: List[Order]) -> pd.DataFrame:
     return df
 
 
-def plot_top_clients_by_orders(orders: List[Order], top_n: int = 5):
-    """Строит столбчатую диаграмму топ N клиентов по количеству заказов."""
-    df = orders_to_dataframe(orders)
-    count_orders = df.groupby(["client_id", "client_name"])["order_id"].nunique().reset_index()
+def _typed_order_lines(rows: list) -> pd.DataFrame:
+    """Создаёт DataFrame из строк позиций заказов и приводит столбцы к компактным типам."""
+    df = pd.DataFrame.from_records(rows, columns=ORDER_LINE_COLUMNS)
+    df = df.astype(ORDER_LINE_DTYPES)
+    df["date"] = pd.to_datetime(df["date"], format="ISO8601")
+    return df
+
+
+def order_lines_frame(db: Database, chunk_size: int = ORDER_LINES_CHUNK_SIZE) -> pd.DataFrame:
+    """Строит таблицу позиций заказов одним SQL-запросом, не создавая объекты Order.
+
+    Строки читаются из курсора порциями по chunk_size; столбцы те же, что у
+    orders_to_dataframe, но с типами category, datetime64, int32 и float32.
+    """
+    frames = [_typed_order_lines(rows) for rows in db.iter_order_lines(chunk_size)]
+    if not frames:
+        return _typed_order_lines([])
+    if len(frames) == 1:
+        return frames[0]
+    columns = {}
+    for column in ORDER_LINE_COLUMNS:
+        if ORDER_LINE_DTYPES.get(column) == "category":
+            columns[column] = union_categoricals([f[column] for f in frames])
+        else:
+            columns[column] = pd.concat([f[column] for f in frames], ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+def iter_order_line_frames(db: Database, chunk_size: int = ORDER_LINES_CHUNK_SIZE,
+                           ordered: bool = False):
+    """Выдаёт таблицу позиций заказов порциями по chunk_size строк (типы как у order_lines_frame).
+
+    ordered=True — по возрастанию order_id, позиции одного заказа идут подряд.
+    """
+    for rows in db.iter_order_lines(chunk_size, ordered):
+        yield _typed_order_lines(rows)
+
+
+def _add_partial(total, partial):
+    """Складывает частичный результат группировки с накопленным (по совпадающим ключам)."""
+    if total is None:
+        return partial
+    return total.add(partial, fill_value=0)
+
+
+def _partial_order_stats(frames) -> tuple:
+    """Группирует порции позиций заказов (по возрастанию order_id) и складывает частичные итоги.
+
+    Возвращает (заказы по клиентам, заказы и выручка по дням, продажи по товарам,
+    имена клиентов, названия товаров); заказ, начатый в предыдущей порции,
+    второй раз не считается.
+    """
+    clients = dates = products = None
+    client_names, product_names = {}, {}
+    last_order = None
+    for df in frames:
+        revenue = df["price"].astype("float64") * df["quantity"]
+        orders = df.drop_duplicates("order_id")
+        if last_order is not None:
+            orders = orders[orders["order_id"] != last_order]
+        last_order = df["order_id"].iat[-1]
+
+        clients = _add_partial(clients, orders.groupby("client_id").size())
+        dates = _add_partial(dates, pd.DataFrame({
+            "order_id": orders.groupby(orders["date"].dt.normalize()).size(),
+            "revenue": revenue.groupby(df["date"].dt.normalize()).sum(),
+        }).fillna(0))
+        products = _add_partial(products, pd.DataFrame({
+            "units": df.groupby("product_id")["quantity"].sum(),
+            "revenue": revenue.groupby(df["product_id"]).sum(),
+        }))
+        named = orders.drop_duplicates("client_id")
+        client_names.update(zip(named["client_id"].tolist(), named["client_name"].astype(str).tolist()))
+        named = df.drop_duplicates("product_id")
+        product_names.update(zip(named["product_id"].tolist(), named["product_name"].astype(str).tolist()))
+    return clients, dates, products, client_names, product_names
+
+
+def _order_stats_tables(partials: list) -> dict:
+    """Складывает частичные итоги _partial_order_stats и строит таблицы streamed_order_stats."""
+    clients = dates = products = None
+    client_names, product_names = {}, {}
+    for part_clients, part_dates, part_products, part_client_names, part_product_names in partials:
+        if part_clients is None:
+            continue
+        clients = _add_partial(clients, part_clients)
+        dates = _add_partial(dates, part_dates)
+        products = _add_partial(products, part_products)
+        client_names.update(part_client_names)
+        product_names.update(part_product_names)
+
+    if clients is None:
+        clients = pd.Series(dtype="int64")
+        dates = pd.DataFrame({"order_id": pd.Series(dtype="int64"), "revenue": pd.Series(dtype="float64")})
+        products = pd.DataFrame({"units": pd.Series(dtype="int64"), "revenue": pd.Series(dtype="float64")})
+
+    per_client = clients.astype("int64").rename("order_id").rename_axis("client_id").reset_index()
+    per_client.insert(1, "client_name", per_client["client_id"].map(client_names))
+    per_client = per_client.sort_values(["order_id", "client_id"], ascending=[False, True])
+
+    per_date = dates.sort_index().astype({"order_id": "int64"}).rename_axis("date_only").reset_index()
+    per_date["date_only"] = pd.to_datetime(per_date["date_only"]).dt.date
+
+    per_product = products.astype({"units": "int64"}).rename_axis("product_id").reset_index()
+    per_product.insert(1, "product_name", per_product["product_id"].map(product_names))
+    per_product = per_product.sort_values(["revenue", "product_id"], ascending=[False, True])
+    return {"clients": per_client.reset_index(drop=True), "dates": per_date,
+            "products": per_product.reset_index(drop=True)}
+
+
+@memoized
+def streamed_order_stats(db: Database, chunk_size: int = ORDER_LINES_CHUNK_SIZE) -> dict:
+    """Считает сводную статистику за один проход по позициям заказов порциями по chunk_size строк.
+
+    Каждая порция группируется отдельно, частичные результаты складываются,
+    поэтому память зависит от числа клиентов, дней и товаров, а не от числа
+    позиций. Позиции читаются по возрастанию order_id, и заказ, начатый в
+    предыдущей порции, второй раз не считается.
+    Возвращает словарь таблиц: "clients" (client_id, client_name, order_id —
+    число заказов, по убыванию), "dates" (date_only, order_id, revenue) и
+    "products" (product_id, product_name, units, revenue, по убыванию выручки).
+    """
+    return _order_stats_tables([_partial_order_stats(iter_order_line_frames(db, chunk_size, ordered=True))])
+
+
+def _partition_order_stats(db_name: str, condition: str, params: tuple, chunk_size: int,
+                           order_by: str) -> tuple:
+    """Обработчик процесса: частичная статистика по одной части заказов (см. parallel_order_stats)."""
+    frames = (_typed_order_lines(rows)
+              for rows in read_order_lines(db_name, condition, params, chunk_size, order_by))
+    return _partial_order_stats(frames)
+
+
+def order_partitions(db: Database, partition_by: str = "date", parts: int = PARALLEL_WORKERS) -> List[Tuple[str, tuple]]:
+    """Делит заказы на parts частей по диапазонам дат ("date"), client_id ("client")
+    или позиции по диапазонам product_id ("product").
+
+    Возвращает список (условие WHERE по псевдонимам o и op, параметры);
+    каждый заказ (для "product" — каждая позиция) попадает ровно в одну часть.
+    """
+    if partition_by not in PARTITION_COLUMNS:
+        raise ValueError(f"Неизвестный способ разбиения: {partition_by}")
+    table, column, alias = PARTITION_COLUMNS[partition_by]
+    low, high = db.get_column_range(table, column)
+    if low is None:
+        return []
+    if partition_by == "date":
+        start, stop = datetime.fromisoformat(low), datetime.fromisoformat(high)
+        step = max((stop - start) / parts, timedelta(days=1))
+        bounds = [(start + step * i).isoformat() for i in range(1, parts)
+                  if (start + step * i).isoformat() <= high]
+    else:
+        step = max((high - low + 1) // parts, 1)
+        bounds = [low + step * i for i in range(1, parts) if low + step * i <= high]
+    edges = [None] + bounds + [None]
+    partitions = []
+    for lower, upper in zip(edges, edges[1:]):
+        conditions = [f"{alias} >= ?"] * (lower is not None) + [f"{alias} < ?"] * (upper is not None)
+        params = tuple(value for value in (lower, upper) if value is not None)
+        partitions.append((" AND ".join(conditions), params))
+    return partitions
+
+
+def _run_partitions(worker, db: Database, partitions: list, workers: int, *args) -> list:
+    """Выполняет worker(файл базы, условие, параметры, *args) для каждой части в пуле процессов."""
+    db_name = str(Path(db.db_name).absolute())
+    if len(partitions) <= 1 or workers <= 1:
+        return [worker(db_name, condition, params, *args) for condition, params in partitions]
+    with ProcessPoolExecutor(max_workers=min(workers, len(partitions))) as pool:
+        futures = [pool.submit(worker, db_name, condition, params, *args) for condition, params in partitions]
+        return [future.result() for future in futures]
+
+
+@memoized
+def parallel_order_stats(db: Database, partition_by: str = "date", workers: int = PARALLEL_WORKERS,
+                         chunk_size: int = ORDER_LINES_CHUNK_SIZE) -> dict:
+    """Считает то же, что streamed_order_stats, параллельно в нескольких процессах.
+
+    Заказы делятся order_partitions по датам или client_id; каждая часть
+    обрабатывается в ProcessPoolExecutor своим соединением только для чтения,
+    частичные итоги складываются. Для базы в памяти считается в одном процессе.
+    """
+    if db.db_name == ":memory:":
+        return streamed_order_stats(db, chunk_size)
+    if partition_by not in PARTITION_ORDER_BY:
+        raise ValueError("Статистика заказов делится только по датам или клиентам")
+    partitions = order_partitions(db, partition_by, workers)
+    return _order_stats_tables(_run_partitions(_partition_order_stats, db, partitions, workers,
+                                               chunk_size, PARTITION_ORDER_BY[partition_by]))
+
+
+def _streaming_chunk(db: Database, chunk_size: Optional[int]) -> Optional[int]:
+    """Размер порции для потоковой статистики: заданный или, если в базе нет сводных таблиц,
+    ORDER_LINES_CHUNK_SIZE; None — читать сводные таблицы."""
+    if chunk_size is None and db.get_schema_version() < AGGREGATES_SCHEMA:
+        return ORDER_LINES_CHUNK_SIZE
+    return chunk_size
+
+
+def _order_stats(db: Database, chunk_size: Optional[int], workers: Optional[int]) -> Optional[dict]:
+    """Таблицы статистики заказов, посчитанные по позициям (параллельно, если задан workers),
+    или None, если нужно читать сводные таблицы."""
+    if workers is not None:
+        return parallel_order_stats(db, workers=workers, chunk_size=chunk_size or ORDER_LINES_CHUNK_SIZE)
+    chunk_size = _streaming_chunk(db, chunk_size)
+    if chunk_size is not None:
+        return streamed_order_stats(db, chunk_size)
+    return None
+
+
+def _as_frame(data: OrdersData) -> pd.DataFrame:
+    """Возвращает таблицу позиций заказов: готовый DataFrame или результат orders_to_dataframe."""
+    if isinstance(data, pd.DataFrame):
+        return data
+    return orders_to_dataframe(data)
+
+
+@memoized
+def top_clients_by_orders(data: AnalyticsSource, top_n: int = 5, chunk_size: Optional[int] = None,
+                          workers: Optional[int] = None) -> pd.DataFrame:
+    """Возвращает топ N клиентов по количеству заказов (столбцы client_id, client_name, order_id).
+
+    data — список заказов, таблица позиций (orders_to_dataframe, order_lines_frame)
+    или база данных; из базы результат читается из сводной таблицы client_order_stats,
+    а если задан chunk_size — считается потоково (streamed_order_stats), если
+    задан workers — в workers процессах (parallel_order_stats).
+    """
+    if isinstance(data, Database):
+        stats = _order_stats(data, chunk_size, workers)
+        if stats is not None:
+            return stats["clients"].head(top_n)
+        rows = data.get_top_clients_by_orders(top_n)
+        return pd.DataFrame(rows, columns=["client_id", "client_name", "order_id"])
+    df = _as_frame(data)
+    count_orders = df.groupby(["client_id", "client_name"], observed=True)["order_id"].nunique().reset_index()
     count_orders = count_orders.sort_values(by="order_id", ascending=False).head(top_n)
+    # Категориальный столбец вывел бы на графике всех клиентов, а не только топ N
+    return count_orders.astype({"client_name": str})
+
 
+def draw_top_clients(count_orders: pd.DataFrame, top_n: int = 5):
+    """Рисует столбчатую диаграмму по результату top_clients_by_orders."""
     plt.figure(figsize=(10, 6))
     sns.barplot(x="order_id", y="client_name", data=count_orders, palette="viridis")
     plt.xlabel("Число заказов")
@@ -50,14 +334,37 @@ def plot_top_clients_by_orders(orders: List[Order], top_n: int = 5):
     plt.show()
 
 
-def plot_orders_dynamics(orders: List[Order]):
-    """Строит линейный график динамики количества заказов по датам."""
-    df = orders_to_dataframe(orders)
-    df['date_only'] = df['date'].dt.date
-    orders_per_date = df.groupby('date_only')["order_id"].nunique().reset_index()
+def plot_top_clients_by_orders(data: AnalyticsSource, top_n: int = 5, chunk_size: Optional[int] = None,
+                               workers: Optional[int] = None):
+    """Строит столбчатую диаграмму топ N клиентов по количеству заказов."""
+    draw_top_clients(top_clients_by_orders(data, top_n, chunk_size, workers), top_n)
+
+
+@memoized
+def orders_per_date(data: AnalyticsSource, chunk_size: Optional[int] = None,
+                    workers: Optional[int] = None) -> pd.DataFrame:
+    """Возвращает количество заказов по датам (столбцы date_only, order_id).
+
+    Для базы данных результат читается из сводной таблицы daily_order_stats
+    (или, если задан chunk_size или workers, считается по позициям, как в
+    top_clients_by_orders) и дополнительно содержит столбец revenue (выручка за день).
+    """
+    if isinstance(data, Database):
+        stats = _order_stats(data, chunk_size, workers)
+        if stats is not None:
+            return stats["dates"]
+        per_date = pd.DataFrame(data.get_daily_order_stats(), columns=["date_only", "order_id", "revenue"])
+        per_date["date_only"] = pd.to_datetime(per_date["date_only"]).dt.date
+        return per_date
+    df = _as_frame(data)
+    date_only = df['date'].dt.date.rename('date_only')
+    return df.groupby(date_only)["order_id"].nunique().reset_index()
+
 
+def draw_orders_dynamics(per_date: pd.DataFrame):
+    """Рисует линейный график по результату orders_per_date."""
     plt.figure(figsize=(12, 6))
-    sns.lineplot(data=orders_per_date, x='date_only', y='order_id', marker='o')
+    sns.lineplot(data=per_date, x='date_only', y='order_id', marker='o')
     plt.xlabel("Дата")
     plt.ylabel("Количество заказов")
     plt.title("Динамика количества заказов по датам")
@@ -66,51 +373,357 @@ def plot_orders_dynamics(orders: List[Order]):
     plt.show()
 
 
-def build_clients_graph(orders: List[Order]):
-    """Создаёт граф связей клиентов на основе общих товаров в заказах."""
-    client_products = {}
-    for order in orders:
-        cid = order.client.client_id
-        if cid not in client_products:
-            client_products[cid] = set()
-        for product in order.products:
-            client_products[cid].add(product.product_id)
+def plot_orders_dynamics(data: AnalyticsSource, chunk_size: Optional[int] = None,
+                         workers: Optional[int] = None):
+    """Строит линейный график динамики количества заказов по датам."""
+    draw_orders_dynamics(orders_per_date(data, chunk_size, workers))
+
+
+@memoized
+def revenue_per_product(data: AnalyticsSource, chunk_size: Optional[int] = None,
+                        workers: Optional[int] = None) -> pd.DataFrame:
+    """Возвращает продажи по товарам (столбцы product_id, product_name, units, revenue), по убыванию выручки.
+
+    Для базы данных результат читается из сводной таблицы product_sales_stats
+    (или, если задан chunk_size или workers, считается по позициям).
+    """
+    columns = ["product_id", "product_name", "units", "revenue"]
+    if isinstance(data, Database):
+        stats = _order_stats(data, chunk_size, workers)
+        if stats is not None:
+            return stats["products"]
+        return pd.DataFrame(data.get_product_sales_stats(), columns=columns)
+    df = _as_frame(data)
+    lines = df[["product_id", "product_name", "quantity"]].assign(
+        revenue=df["price"].astype("float64") * df["quantity"])
+    per_product = (lines.groupby(["product_id", "product_name"], observed=True)
+                   .agg(units=("quantity", "sum"), revenue=("revenue", "sum")).reset_index())
+    per_product = per_product.sort_values(["revenue", "product_id"], ascending=[False, True])
+    return per_product.astype({"product_name": str})[columns].reset_index(drop=True)
+
+
+def client_product_pairs(data: OrdersData) -> pd.DataFrame:
+    """Возвращает уникальные пары (client_id, product_id) — кто какие товары покупал."""
+    if isinstance(data, pd.DataFrame):
+        pairs = data[["client_id", "product_id"]]
+    else:
+        pairs = pd.DataFrame([(order.client.client_id, product.product_id)
+                              for order in data for product in order.products],
+                             columns=["client_id", "product_id"])
+    return pairs.drop_duplicates().reset_index(drop=True)
+
+
+def _merge_pair_counts(codes_parts: list, counts_parts: list):
+    """Складывает частичные счётчики пар клиентов (коды пар и их веса)."""
+    codes = np.concatenate(codes_parts)
+    counts = np.concatenate(counts_parts)
+    unique_codes, inverse = np.unique(codes, return_inverse=True)
+    return unique_codes, np.bincount(inverse, weights=counts).astype(np.int64)
+
+
+def _strongest_edges(nodes_a: np.ndarray, nodes_b: np.ndarray, weights: np.ndarray, top_k: int) -> np.ndarray:
+    """Возвращает номера рёбер, входящих в top_k самых сильных связей хотя бы одного из концов."""
+    # Каждое ребро дважды (по разу для каждого конца), сортировка по клиенту и убыванию веса
+    nodes = np.concatenate([nodes_a, nodes_b])
+    edge_ids = np.tile(np.arange(len(nodes_a)), 2)
+    by_node = np.lexsort((-np.tile(weights, 2), nodes))
+    sorted_nodes = nodes[by_node]
+    rank = np.arange(len(by_node)) - np.searchsorted(sorted_nodes, sorted_nodes, side="left")
+    return np.unique(edge_ids[by_node[rank < top_k]])
+
+
+def co_purchase_edges(pairs: pd.DataFrame, min_weight: int = 1, top_k: Optional[int] = None,
+                      max_clients_per_product: Optional[int] = None,
+                      chunk_pairs: int = GRAPH_CHUNK_PAIRS) -> pd.DataFrame:
+    """Считает рёбра графа совместных покупок по инвертированному индексу товар -> клиенты.
+
+    pairs — результат client_product_pairs. Вес ребра — число общих товаров
+    у двух клиентов. Пары накапливаются порциями по chunk_pairs и сразу
+    сворачиваются в счётчики, поэтому память ограничена числом различных рёбер.
+    min_weight отбрасывает слабые рёбра, top_k оставляет для каждого клиента
+    только k самых сильных связей, max_clients_per_product пропускает товары,
+    которые покупали слишком многие (они связывают почти всех со всеми).
+    Возвращает DataFrame со столбцами client_a, client_b, weight.
+    """
+    empty = pd.DataFrame({"client_a": pd.Series(dtype="int64"), "client_b": pd.Series(dtype="int64"),
+                          "weight": pd.Series(dtype="int64")})
+    if pairs.empty:
+        return empty
+
+    client_ids, client_index = np.unique(pairs["client_id"].to_numpy(), return_inverse=True)
+    order = np.lexsort((client_index, pairs["product_id"].to_numpy()))
+    clients_by_product = client_index[order]
+    _, starts, sizes = np.unique(pairs["product_id"].to_numpy()[order], return_index=True, return_counts=True)
+    base = np.int64(len(client_ids))
+
+    merged_codes, merged_counts = [np.empty(0, np.int64)], [np.empty(0, np.int64)]
+    pending = []
+    pending_size = 0
+    for start, size in zip(starts, sizes):
+        if size < 2 or (max_clients_per_product and size > max_clients_per_product):
+            continue
+        members = clients_by_product[start:start + size].astype(np.int64)
+        i, j = np.triu_indices(size, k=1)
+        pending.append(members[i] * base + members[j])
+        pending_size += len(i)
+        if pending_size >= chunk_pairs:
+            codes, counts = np.unique(np.concatenate(pending), return_counts=True)
+            merged = _merge_pair_counts(merged_codes + [codes], merged_counts + [counts])
+            merged_codes, merged_counts = [merged[0]], [merged[1]]
+            pending, pending_size = [], 0
+    if pending:
+        codes, counts = np.unique(np.concatenate(pending), return_counts=True)
+        merged_codes.append(codes)
+        merged_counts.append(counts)
+    codes, weights = _merge_pair_counts(merged_codes, merged_counts)
+
+    keep = weights >= min_weight
+    codes, weights = codes[keep], weights[keep]
+    if top_k is not None and len(codes):
+        strongest = _strongest_edges(codes // base, codes % base, weights, top_k)
+        codes, weights = codes[strongest], weights[strongest]
+    if not len(codes):
+        return empty
+    return pd.DataFrame({"client_a": client_ids[codes // base], "client_b": client_ids[codes % base],
+                         "weight": weights})
+
+
+def build_clients_graph(data: OrdersData, min_weight: int = 1, top_k: Optional[int] = None,
+                        max_clients_per_product: Optional[int] = None, as_networkx: bool = True):
+    """Создаёт граф связей клиентов на основе общих товаров в заказах.
+
+    Рёбра считаются через co_purchase_edges (параметры отсечения описаны там).
+    При as_networkx=False возвращает DataFrame рёбер, не создавая nx.Graph.
+    """
+    pairs = client_product_pairs(data)
+    edges = co_purchase_edges(pairs, min_weight, top_k, max_clients_per_product)
+    if not as_networkx:
+        return edges
 
     """Создаем граф"""
     G = nx.Graph()
 
     """Добавляем узлы с метками клиентов (client_id)"""
-    for cid in client_products:
-        G.add_node(cid)
+    if isinstance(data, pd.DataFrame):
+        G.add_nodes_from(pd.unique(data["client_id"]).tolist())
+    else:
+        G.add_nodes_from(dict.fromkeys(order.client.client_id for order in data))
 
     """Добавляем ребра между клиентами, если у них есть общие товары"""
-    clients = list(client_products.keys())
-    for i in range(len(clients)):
-        for j in range(i + 1, len(clients)):
-            c1, c2 = clients[i], clients[j]
-            common_products = client_products[c1].intersection(client_products[c2])
-            if common_products:
-                G.add_edge(c1, c2, weight=len(common_products))
-
+    G.add_weighted_edges_from(zip(edges["client_a"].tolist(), edges["client_b"].tolist(),
+                                  edges["weight"].tolist()))
     return G
 
 
-def plot_clients_graph(G: nx.Graph, clients: List[Client]):
-    """Строит визуализацию графа связей клиентов."""
-    plt.figure(figsize=(12, 12))
-    pos = nx.spring_layout(G, k=0.5, iterations=50)
+def _partition_edges(db_name: str, condition: str, params: tuple,
+                     max_clients_per_product: Optional[int]) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Обработчик процесса: рёбра по товарам одной части и клиенты, покупавшие эти товары."""
+    pairs = pd.DataFrame(read_client_product_pairs(db_name, condition, params), columns=["client_id", "product_id"])
+    edges = co_purchase_edges(pairs, max_clients_per_product=max_clients_per_product)
+    return edges, pd.unique(pairs["client_id"])
+
+
+def parallel_co_purchase_edges(db: Database, min_weight: int = 1, top_k: Optional[int] = None,
+                               max_clients_per_product: Optional[int] = None,
+                               workers: int = PARALLEL_WORKERS) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Считает co_purchase_edges по базе в нескольких процессах.
+
+    Позиции делятся по диапазонам product_id: вес ребра — число общих товаров,
+    поэтому веса из разных частей просто складываются, а отсечения min_weight
+    и top_k применяются после слияния. Возвращает (рёбра, ID клиентов с заказами).
+    """
+    partitions = order_partitions(db, "product", workers)
+    results = _run_partitions(_partition_edges, db, partitions, workers, max_clients_per_product)
+    empty = co_purchase_edges(pd.DataFrame(columns=["client_id", "product_id"]))
+    clients = np.unique(np.concatenate([part_clients for _, part_clients in results] or [np.empty(0, np.int64)]))
+    parts = [edges for edges, _ in results if not edges.empty]
+    if not parts:
+        return empty, clients
+    edges = (pd.concat(parts, ignore_index=True)
+             .groupby(["client_a", "client_b"], sort=True)["weight"].sum().reset_index())
+    edges = edges[edges["weight"] >= min_weight].reset_index(drop=True)
+    if top_k is not None and not edges.empty:
+        strongest = _strongest_edges(edges["client_a"].to_numpy(), edges["client_b"].to_numpy(),
+                                     edges["weight"].to_numpy(), top_k)
+        edges = edges.iloc[strongest].reset_index(drop=True)
+    return (edges if not edges.empty else empty), clients
+
 
-    """Создаем словарь client_id -> name"""
-    id_to_name = {c.client_id: c.name for c in clients}
+def graph_signature(G: nx.Graph) -> str:
+    """Возвращает отпечаток графа (узлы и рёбра с весами) для кеширования расположения."""
+    digest = hashlib.sha1()
+    digest.update(repr(sorted(G.nodes())).encode())
+    digest.update(repr(sorted((min(u, v), max(u, v), w) for u, v, w in G.edges(data="weight"))).encode())
+    return digest.hexdigest()
 
-    nx.draw_networkx_nodes(G, pos, node_size=500, node_color='skyblue')
-    nx.draw_networkx_edges(G, pos, width=[G[u][v]['weight'] for u, v in G.edges()], alpha=0.7)
-    nx.draw_networkx_labels(G, pos, labels=id_to_name, font_size=10)
 
-    plt.title("Граф связей клиентов по общим товарам")
+def save_layout(pos: dict, filepath: str, signature: Optional[str] = None) -> None:
+    """Сохраняет расположение узлов графа в JSON файл."""
+    data = {"signature": signature, "positions": {str(node): [float(x), float(y)] for node, (x, y) in pos.items()}}
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+def load_layout(filepath: str) -> Tuple[Optional[str], dict]:
+    """Читает расположение узлов из JSON файла; возвращает (отпечаток графа, позиции)."""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    positions = {}
+    for node, xy in data["positions"].items():
+        key = int(node) if node.lstrip("-").isdigit() else node
+        positions[key] = np.array(xy)
+    return data.get("signature"), positions
+
+
+def clients_graph_layout(G: nx.Graph, layout_path: Optional[str] = None) -> dict:
+    """Вычисляет расположение узлов графа клиентов (client_id -> координаты).
+
+    Результат кешируется в памяти по отпечатку графа; если задан layout_path,
+    расположение читается из этого файла (когда граф не изменился) и записывается в него.
+    """
+    signature = graph_signature(G)
+    with _layout_cache_lock:
+        if signature in _layout_cache:
+            _layout_cache.move_to_end(signature)
+            return _layout_cache[signature]
+
+    pos = None
+    if layout_path and os.path.exists(layout_path):
+        try:
+            saved_signature, saved_pos = load_layout(layout_path)
+            if saved_signature == signature:
+                pos = saved_pos
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Не удалось прочитать расположение графа из {layout_path}: {e}")
+    if pos is None:
+        pos = nx.spring_layout(G, k=0.5, iterations=50)
+        if layout_path:
+            save_layout(pos, layout_path, signature)
+
+    with _layout_cache_lock:
+        _layout_cache[signature] = pos
+        _layout_cache.move_to_end(signature)
+        if len(_layout_cache) > LAYOUT_CACHE_SIZE:
+            _layout_cache.popitem(last=False)
+    return pos
+
+
+def threshold_graph(G: nx.Graph, min_weight: int) -> nx.Graph:
+    """Возвращает копию графа без рёбер легче min_weight (узлы сохраняются)."""
+    H = nx.Graph()
+    H.add_nodes_from(G.nodes(data=True))
+    H.add_edges_from((u, v, d) for u, v, d in G.edges(data=True) if d.get("weight", 1) >= min_weight)
+    return H
+
+
+def aggregate_communities(G: nx.Graph, method: str = "louvain", max_groups: int = MAX_GRAPH_GROUPS,
+                          seed: int = 0) -> nx.Graph:
+    """Объединяет сообщества клиентов в супер-узлы.
+
+    method — "louvain" или "label_propagation" (быстрее на очень больших графах).
+    У супер-узла атрибуты size (число клиентов) и members (их client_id);
+    вес ребра между супер-узлами — сумма весов рёбер между их клиентами.
+    Если сообществ больше max_groups, самые мелкие объединяются в последний узел.
+    """
+    if method == "label_propagation":
+        communities = nx.community.asyn_lpa_communities(G, weight="weight", seed=seed)
+    else:
+        communities = nx.community.louvain_communities(G, weight="weight", seed=seed)
+    communities = sorted((sorted(c) for c in communities), key=len, reverse=True)
+    if len(communities) > max_groups:
+        rest = [node for members in communities[max_groups - 1:] for node in members]
+        communities = communities[:max_groups - 1] + [rest]
+
+    membership = {}
+    H = nx.Graph()
+    for index, members in enumerate(communities):
+        H.add_node(index, size=len(members), members=members)
+        for node in members:
+            membership[node] = index
+
+    weights = Counter()
+    for u, v, w in G.edges(data="weight", default=1):
+        cu, cv = membership[u], membership[v]
+        if cu != cv:
+            weights[(min(cu, cv), max(cu, cv))] += w
+    H.add_weighted_edges_from((cu, cv, w) for (cu, cv), w in weights.items())
+    return H
+
+
+def clients_graph_view(G: nx.Graph, clients: List[Client], large: Optional[bool] = None,
+                       min_weight: int = 1, method: str = "louvain",
+                       layout_path: Optional[str] = None) -> dict:
+    """Готовит всё, что нужно для рисования графа клиентов (вычисления без matplotlib).
+
+    Если граф больше LARGE_GRAPH_NODES узлов (или large=True), рёбра легче
+    min_weight отбрасываются, а сообщества клиентов объединяются в супер-узлы.
+    """
+    if large is None:
+        large = G.number_of_nodes() > LARGE_GRAPH_NODES
+    if not large:
+        id_to_name = {c.client_id: c.name for c in clients}
+        return {
+            "graph": G,
+            "pos": clients_graph_layout(G, layout_path),
+            "labels": {node: id_to_name[node] for node in G.nodes() if node in id_to_name},
+            "node_size": 500,
+            "widths": [G[u][v]['weight'] for u, v in G.edges()],
+            "title": "Граф связей клиентов по общим товарам",
+        }
+
+    H = aggregate_communities(threshold_graph(G, min_weight), method)
+    max_weight = max((w for _, _, w in H.edges(data="weight")), default=1)
+    return {
+        "graph": H,
+        "pos": clients_graph_layout(H, layout_path),
+        "labels": {node: str(size) for node, size in H.nodes(data="size") if size > 1},
+        "node_size": [100 + 20 * size ** 0.5 for _, size in H.nodes(data="size")],
+        "widths": [0.5 + 7.5 * H[u][v]['weight'] / max_weight for u, v in H.edges()],
+        "title": (f"Группы клиентов по общим товарам: {H.number_of_nodes()} групп "
+                  f"из {G.number_of_nodes()} клиентов (число — размер группы)"),
+    }
+
+
+@memoized
+def clients_graph_view_from_db(db: Database, min_weight: int = 1, top_k: Optional[int] = None,
+                               layout_path: Optional[str] = None, workers: Optional[int] = None) -> Optional[dict]:
+    """Строит граф клиентов по данным базы и готовит его к рисованию (см. clients_graph_view).
+
+    При заданном workers рёбра считаются в нескольких процессах (parallel_co_purchase_edges).
+    Результат кешируется до следующего изменения данных; None, если заказов или клиентов нет.
+    """
+    clients = db.get_all_clients()
+    if workers is not None and db.db_name != ":memory:":
+        edges, client_ids = parallel_co_purchase_edges(db, min_weight, top_k, workers=workers)
+        if not len(client_ids) or not clients:
+            return None
+        G = nx.Graph()
+        G.add_nodes_from(client_ids.tolist())
+        G.add_weighted_edges_from(zip(edges["client_a"].tolist(), edges["client_b"].tolist(),
+                                      edges["weight"].tolist()))
+    else:
+        lines = order_lines_frame(db)
+        if lines.empty or not clients:
+            return None
+        G = build_clients_graph(lines, min_weight=min_weight, top_k=top_k)
+    return clients_graph_view(G, clients, min_weight=min_weight, layout_path=layout_path)
+
+
+def draw_graph_view(view: dict):
+    """Рисует граф по результату clients_graph_view."""
+    plt.figure(figsize=(12, 12))
+    G, pos = view["graph"], view["pos"]
+    nx.draw_networkx_nodes(G, pos, node_size=view["node_size"], node_color='skyblue')
+    nx.draw_networkx_edges(G, pos, width=view["widths"], alpha=0.7)
+    nx.draw_networkx_labels(G, pos, labels=view["labels"], font_size=10)
+
+    plt.title(view["title"])
     plt.axis('off')
     plt.tight_layout()
     plt.show()
 
 
-
+def plot_clients_graph(G: nx.Graph, clients: List[Client], large: Optional[bool] = None,
+                       min_weight: int = 1, layout_path: Optional[str] = None):
+    """Строит визуализацию графа связей клиентов; большие графы сворачиваются в группы."""
+    draw_graph_view(clients_graph_view(G, clients, large, min_weight, layout_path=layout_path))
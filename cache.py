@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import functools
+import glob
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+
+from db import Database
+
+CACHE_MAX_ENTRIES = 32  # результатов, хранимых в памяти
+
+
+class ResultCache:
+    """Кеш результатов аналитики с вытеснением давно не использованных записей (LRU).
+
+    Ключ записи — имя функции, её параметры, файл базы, его идентификатор
+    (Database.get_db_identity) и версия данных базы (Database.get_data_version):
+    база, пересозданная по тому же пути, не получит чужих результатов, а после
+    любого изменения клиентов, товаров или заказов старые результаты больше
+    не используются и удаляются
+    (изменения сторонними программами учитываются со схемы DATA_VERSION_TRIGGERS_SCHEMA).
+    Если задан directory, результаты дополнительно сохраняются в файлы pickle
+    и переживают перезапуск программы.
+    """
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, directory: Optional[str] = None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # ключ -> результат
+        self._versions = {}  # файл базы -> состояние данных (идентификатор и версия), для которого хранятся записи
+        self._lock = threading.Lock()
+
+    def call(self, db: Database, func: Callable, *args, **kwargs):
+        """Возвращает func(db, *args, **kwargs), по возможности из кеша."""
+        version = db.get_data_version()
+        if version is None:
+            return func(db, *args, **kwargs)
+        identity = db.get_db_identity()
+        # Состояние данных: идентификатор базы (если он есть в схеме) и версия данных
+        version = f"{identity}_{version}" if identity else str(version)
+
+        db_key = str(Path(db.db_name).absolute()) if db.db_name != ":memory:" else f":memory:{id(db)}"
+        name = f"{func.__module__}.{func.__qualname__}"
+        key = (db_key, version, name, repr(args), repr(sorted(kwargs.items())))
+
+        with self._lock:
+            if self._versions.get(db_key) != version:
+                self._invalidate(db_key, version)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        found, result = self._load(db_key, version, key)
+        if not found:
+            result = func(db, *args, **kwargs)
+            self._save(db_key, version, key, result)
+
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if self._versions.get(db_key) == version:
+                self._entries[key] = result
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        """Удаляет все записи из памяти и с диска."""
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            if self.directory and os.path.isdir(self.directory):
+                for path in glob.glob(os.path.join(self.directory, "*.pkl")):
+                    os.remove(path)
+
+    def stats(self) -> dict:
+        """Возвращает число попаданий, промахов и записей в памяти."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def _invalidate(self, db_key: str, version: str):
+        """Удаляет записи базы db_key, сохранённые для других версий данных."""
+        for key in [k for k in self._entries if k[0] == db_key]:
+            del self._entries[key]
+        self._versions[db_key] = version
+        if self.directory:
+            prefix = self._file_prefix(db_key)
+            current = f"{prefix}_{version}_"
+            for path in glob.glob(os.path.join(self.directory, f"{prefix}_*.pkl")):
+                if not os.path.basename(path).startswith(current):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    @staticmethod
+    def _file_prefix(db_key: str) -> str:
+        return hashlib.sha1(db_key.encode()).hexdigest()[:16]
+
+    def _path(self, db_key: str, version: str, key: tuple) -> str:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, f"{self._file_prefix(db_key)}_{version}_{digest}.pkl")
+
+    def _load(self, db_key: str, version: str, key: tuple):
+        """Читает результат из файла; возвращает (найден ли, результат)."""
+        if not self.directory or db_key.startswith(":memory:"):
+            return False, None
+        path = self._path(db_key, version, key)
+        if not os.path.exists(path):
+            return False, None
+        try:
+            with open(path, "rb") as f:
+                return True, pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError) as e:
+            print(f"Не удалось прочитать кеш {path}: {e}")
+            return False, None
+
+    def _save(self, db_key: str, version: str, key: tuple, result):
+        """Сохраняет результат в файл, если задан каталог кеша."""
+        if not self.directory or db_key.startswith(":memory:"):
+            return
+        path = self._path(db_key, version, key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + ".tmp", path)
+        except (OSError, pickle.PickleError, TypeError, AttributeError) as e:
+            print(f"Не удалось сохранить кеш {path}: {e}")
+
+
+analysis_cache = ResultCache()
+
+
+def memoized(func: Callable) -> Callable:
+    """Декоратор: если первый аргумент — Database, результат берётся из analysis_cache."""
+    @functools.wraps(func)
+    def wrapper(data, *args, **kwargs):
+        if isinstance(data, Database):
+            return analysis_cache.call(data, func, *args, **kwargs)
+        return func(data, *args, **kwargs)
+    return wrapper
@@ -5,38 +5,910 @@
 
 import sqlite3
 from sqlite3 import Connection
-from typing import List, Optional
-from models import Client, Product, Order
-from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from models import (Client, Product, Order, OrderItem, ProductRegistry, order_items, CONTACT_OK,
+                    contact_error_code, describe_contact_errors)
+from datetime import date, datetime, timedelta
 import json
 import csv
+import gzip
 import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
 
 DB_NAME = "shop.db"
+SQL_CHUNK_SIZE = 500  # число параметров в одном списке IN (...)
+
+# Сумма заказа по ценам на момент заказа (order_products.quantity * unit_price)
+ORDER_TOTAL_SQL = "COALESCE((SELECT SUM(quantity * unit_price) FROM order_products WHERE order_id = {}), 0)"
+# Заказы вместе с суммой; orders.total поддерживается триггерами (миграция 5)
+ORDERS_WITH_TOTAL_SQL = """
+    SELECT order_id, client_id, date, status, total FROM orders
+"""
+ORDER_SORT_FIELDS = {"date": "date", "total": "total"}
+
+# Сводные таблицы для аналитики: число заказов по клиентам, число заказов и
+# выручка по дням, продажи по товарам. Триггеры обновляют их при вставке и
+# удалении заказов и их позиций (позиции удаляются раньше заказа);
+# Database.rebuild_aggregates пересчитывает их заново. Версии *_V2_SQL
+# применяются миграцией 2 (выручка по текущим ценам товаров), миграция 4
+# заменяет их расчётом по количеству и цене позиции на момент заказа.
+AGGREGATE_TABLES = ("client_order_stats", "daily_order_stats", "product_sales_stats")
+AGGREGATE_TABLES_SQL = [
+    """CREATE TABLE IF NOT EXISTS client_order_stats (
+        client_id INTEGER PRIMARY KEY,
+        order_count INTEGER NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS daily_order_stats (
+        day TEXT PRIMARY KEY,
+        order_count INTEGER NOT NULL,
+        revenue REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS product_sales_stats (
+        product_id INTEGER PRIMARY KEY,
+        units INTEGER NOT NULL,
+        revenue REAL NOT NULL
+    )""",
+]
+AGGREGATE_TRIGGERS_V2_SQL = [
+    """CREATE TRIGGER IF NOT EXISTS trg_orders_stats_insert AFTER INSERT ON orders BEGIN
+        INSERT INTO client_order_stats (client_id, order_count) VALUES (NEW.client_id, 1)
+            ON CONFLICT(client_id) DO UPDATE SET order_count = order_count + 1;
+        INSERT INTO daily_order_stats (day, order_count, revenue) VALUES (substr(NEW.date, 1, 10), 1, 0)
+            ON CONFLICT(day) DO UPDATE SET order_count = order_count + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_orders_stats_delete AFTER DELETE ON orders BEGIN
+        UPDATE client_order_stats SET order_count = order_count - 1 WHERE client_id = OLD.client_id;
+        DELETE FROM client_order_stats WHERE client_id = OLD.client_id AND order_count <= 0;
+        UPDATE daily_order_stats SET order_count = order_count - 1 WHERE day = substr(OLD.date, 1, 10);
+        DELETE FROM daily_order_stats WHERE day = substr(OLD.date, 1, 10) AND order_count <= 0;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_order_products_stats_insert AFTER INSERT ON order_products BEGIN
+        INSERT INTO product_sales_stats (product_id, units, revenue)
+            SELECT NEW.product_id, 1, price FROM products WHERE product_id = NEW.product_id
+            ON CONFLICT(product_id) DO UPDATE SET units = units + 1, revenue = revenue + excluded.revenue;
+        UPDATE daily_order_stats
+            SET revenue = revenue + (SELECT price FROM products WHERE product_id = NEW.product_id)
+            WHERE day = (SELECT substr(date, 1, 10) FROM orders WHERE order_id = NEW.order_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_order_products_stats_delete AFTER DELETE ON order_products BEGIN
+        UPDATE product_sales_stats
+            SET units = units - 1,
+                revenue = revenue - (SELECT price FROM products WHERE product_id = OLD.product_id)
+            WHERE product_id = OLD.product_id;
+        DELETE FROM product_sales_stats WHERE product_id = OLD.product_id AND units <= 0;
+        UPDATE daily_order_stats
+            SET revenue = revenue - (SELECT price FROM products WHERE product_id = OLD.product_id)
+            WHERE day = (SELECT substr(date, 1, 10) FROM orders WHERE order_id = OLD.order_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_products_stats_price AFTER UPDATE OF price ON products
+    WHEN NEW.price IS NOT OLD.price BEGIN
+        UPDATE product_sales_stats SET revenue = revenue + (NEW.price - OLD.price) * units
+            WHERE product_id = NEW.product_id;
+        UPDATE daily_order_stats
+            SET revenue = revenue + (NEW.price - OLD.price) * (
+                SELECT COUNT(*) FROM order_products op JOIN orders o ON o.order_id = op.order_id
+                WHERE op.product_id = NEW.product_id AND substr(o.date, 1, 10) = daily_order_stats.day)
+            WHERE day IN (
+                SELECT substr(o.date, 1, 10) FROM order_products op JOIN orders o ON o.order_id = op.order_id
+                WHERE op.product_id = NEW.product_id);
+    END""",
+]
+AGGREGATE_REBUILD_V2_SQL = [
+    "DELETE FROM client_order_stats",
+    "DELETE FROM daily_order_stats",
+    "DELETE FROM product_sales_stats",
+    """INSERT INTO client_order_stats (client_id, order_count)
+        SELECT client_id, COUNT(*) FROM orders GROUP BY client_id""",
+    """INSERT INTO daily_order_stats (day, order_count, revenue)
+        SELECT substr(o.date, 1, 10), COUNT(*),
+               COALESCE(SUM((SELECT SUM(p.price) FROM order_products op
+                             JOIN products p ON p.product_id = op.product_id
+                             WHERE op.order_id = o.order_id)), 0)
+        FROM orders o GROUP BY substr(o.date, 1, 10)""",
+    """INSERT INTO product_sales_stats (product_id, units, revenue)
+        SELECT p.product_id, COUNT(*), SUM(p.price)
+        FROM order_products op JOIN products p ON p.product_id = op.product_id
+        GROUP BY p.product_id""",
+]
+
+AGGREGATE_LINE_TRIGGERS_SQL = [
+    "DROP TRIGGER IF EXISTS trg_order_products_stats_insert",
+    "DROP TRIGGER IF EXISTS trg_order_products_stats_delete",
+    "DROP TRIGGER IF EXISTS trg_products_stats_price",
+    """CREATE TRIGGER trg_order_products_stats_insert AFTER INSERT ON order_products BEGIN
+        INSERT INTO product_sales_stats (product_id, units, revenue)
+            VALUES (NEW.product_id, NEW.quantity, NEW.quantity * NEW.unit_price)
+            ON CONFLICT(product_id) DO UPDATE SET units = units + excluded.units,
+                                                  revenue = revenue + excluded.revenue;
+        UPDATE daily_order_stats SET revenue = revenue + NEW.quantity * NEW.unit_price
+            WHERE day = (SELECT substr(date, 1, 10) FROM orders WHERE order_id = NEW.order_id);
+    END""",
+    """CREATE TRIGGER trg_order_products_stats_delete AFTER DELETE ON order_products BEGIN
+        UPDATE product_sales_stats
+            SET units = units - OLD.quantity, revenue = revenue - OLD.quantity * OLD.unit_price
+            WHERE product_id = OLD.product_id;
+        DELETE FROM product_sales_stats WHERE product_id = OLD.product_id AND units <= 0;
+        UPDATE daily_order_stats SET revenue = revenue - OLD.quantity * OLD.unit_price
+            WHERE day = (SELECT substr(date, 1, 10) FROM orders WHERE order_id = OLD.order_id);
+    END""",
+    """CREATE TRIGGER trg_order_products_stats_update
+    AFTER UPDATE OF order_id, product_id, quantity, unit_price ON order_products BEGIN
+        UPDATE product_sales_stats
+            SET units = units - OLD.quantity, revenue = revenue - OLD.quantity * OLD.unit_price
+            WHERE product_id = OLD.product_id;
+        INSERT INTO product_sales_stats (product_id, units, revenue)
+            VALUES (NEW.product_id, NEW.quantity, NEW.quantity * NEW.unit_price)
+            ON CONFLICT(product_id) DO UPDATE SET units = units + excluded.units,
+                                                  revenue = revenue + excluded.revenue;
+        DELETE FROM product_sales_stats WHERE product_id = OLD.product_id AND units <= 0;
+        UPDATE daily_order_stats SET revenue = revenue - OLD.quantity * OLD.unit_price
+            WHERE day = (SELECT substr(date, 1, 10) FROM orders WHERE order_id = OLD.order_id);
+        UPDATE daily_order_stats SET revenue = revenue + NEW.quantity * NEW.unit_price
+            WHERE day = (SELECT substr(date, 1, 10) FROM orders WHERE order_id = NEW.order_id);
+    END""",
+]
+AGGREGATE_REBUILD_SQL = [
+    "DELETE FROM client_order_stats",
+    "DELETE FROM daily_order_stats",
+    "DELETE FROM product_sales_stats",
+    """INSERT INTO client_order_stats (client_id, order_count)
+        SELECT client_id, COUNT(*) FROM orders GROUP BY client_id""",
+    """INSERT INTO daily_order_stats (day, order_count, revenue)
+        SELECT substr(o.date, 1, 10), COUNT(*),
+               COALESCE(SUM((SELECT SUM(op.quantity * op.unit_price) FROM order_products op
+                             WHERE op.order_id = o.order_id)), 0)
+        FROM orders o GROUP BY substr(o.date, 1, 10)""",
+    """INSERT INTO product_sales_stats (product_id, units, revenue)
+        SELECT product_id, SUM(quantity), SUM(quantity * unit_price)
+        FROM order_products GROUP BY product_id""",
+]
+
+# Полнотекстовые индексы: таблица -> (индекс FTS5, ключ, индексируемые столбцы)
+FTS_INDEXES = {
+    "clients": ("clients_fts", "client_id", ("name", "email", "phone")),
+    "products": ("products_fts", "product_id", ("name",)),
+}
+FTS_SCHEMA = 6  # версия схемы, с которой есть индексы FTS5
+
+
+def _fts_triggers(table: str) -> List[str]:
+    """Триггеры, которые синхронизируют индекс FTS5 таблицы при каждом изменении строки."""
+    fts_table, key, columns = FTS_INDEXES[table]
+    names = ", ".join(columns)
+    new_values = ", ".join(f"NEW.{c}" for c in columns)
+    old_values = ", ".join(f"OLD.{c}" for c in columns)
+    delete_old = (f"INSERT INTO {fts_table} ({fts_table}, rowid, {names}) "
+                  f"VALUES ('delete', OLD.{key}, {old_values});")
+    insert_new = f"INSERT INTO {fts_table} (rowid, {names}) VALUES (NEW.{key}, {new_values});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_insert AFTER INSERT ON {table} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_delete AFTER DELETE ON {table} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_update AFTER UPDATE ON {table} BEGIN "
+        f"{delete_old} {insert_new} END",
+    ]
+
+
+def _fts_statements(table: str) -> List[str]:
+    """Создаёт индекс FTS5 с внешним содержимым (content=table) и триггеры, которые его синхронизируют."""
+    fts_table, key, columns = FTS_INDEXES[table]
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"{', '.join(columns)}, content='{table}', content_rowid='{key}', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')",
+    ] + _fts_triggers(table)
+
+
+# Заказы, у которых клиент или один из товаров подходит под запрос FTS5 (параметр передаётся дважды)
+ORDER_SEARCH_CONDITION = """(client_id IN (SELECT rowid FROM clients_fts WHERE clients_fts MATCH ?)
+    OR order_id IN (SELECT order_id FROM order_products WHERE product_id IN
+                    (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)))"""
+CLIENT_SEARCH_RANK = "bm25(clients_fts, 10.0, 5.0, 5.0)"  # веса столбцов name, email, phone
+
+
+def _fts_query(text: str) -> Optional[str]:
+    """Превращает строку поиска в запрос FTS5: все слова должны встретиться, каждое — как префикс."""
+    terms = re.findall(r"\w+", text)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _data_version_triggers(tables: Tuple[str, ...]) -> List[str]:
+    """Создаёт триггеры, увеличивающие data_version при любом изменении строк таблиц."""
+    statements = []
+    for table in tables:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            statements.append(
+                f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_data_version AFTER {event} ON {table} BEGIN
+                    UPDATE data_version SET version = version + 1 WHERE id = 1;
+                END""")
+    return statements
+
+
+# Миграции схемы. Номер последней применённой хранится в PRAGMA user_version.
+# Запросы из "benchmarks" используются в benchmark_migration, чтобы показать,
+# как миграция меняет план и время выполнения. Запись — (запрос, параметры)
+# или, если до миграции тот же результат получается другим запросом,
+# (запрос, параметры, запрос до миграции, его параметры).
+MIGRATIONS = [
+    {
+        "version": 1,
+        "description": "Индексы по orders.client_id, orders.date и order_products.product_id",
+        "statements": [
+            "CREATE INDEX IF NOT EXISTS idx_orders_client_id ON orders(client_id)",
+            "CREATE INDEX IF NOT EXISTS idx_orders_date ON orders(date, order_id)",
+            "CREATE INDEX IF NOT EXISTS idx_order_products_product_id ON order_products(product_id)",
+        ],
+        "benchmarks": [
+            ("SELECT order_id FROM orders WHERE client_id = ?", (1,)),
+            ("SELECT * FROM orders ORDER BY date DESC, order_id DESC LIMIT 100", ()),
+            ("DELETE FROM order_products WHERE product_id = ?", (1,)),
+        ],
+    },
+    {
+        "version": 2,
+        "description": "Сводные таблицы заказов по клиентам, дням и товарам, обновляемые триггерами",
+        "statements": AGGREGATE_TABLES_SQL + AGGREGATE_TRIGGERS_V2_SQL + AGGREGATE_REBUILD_V2_SQL,
+        "benchmarks": [],
+    },
+    {
+        "version": 3,
+        "description": "Счётчик версии данных для кеша результатов аналитики",
+        "statements": [
+            """CREATE TABLE IF NOT EXISTS data_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )""",
+            "INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)",
+        ],
+        "benchmarks": [],
+    },
+    {
+        "version": 4,
+        "description": "Количество и цена на момент заказа в order_products",
+        "statements": [
+            "ALTER TABLE order_products ADD COLUMN quantity INTEGER NOT NULL DEFAULT 1",
+            "ALTER TABLE order_products ADD COLUMN unit_price REAL NOT NULL DEFAULT 0",
+            """UPDATE order_products SET unit_price = COALESCE(
+                (SELECT price FROM products p WHERE p.product_id = order_products.product_id), 0)""",
+        ] + AGGREGATE_LINE_TRIGGERS_SQL + AGGREGATE_REBUILD_SQL,
+        "benchmarks": [],
+    },
+    {
+        "version": 5,
+        "description": "Столбец orders.total с индексом, поддерживаемый триггерами на order_products",
+        "statements": [
+            "ALTER TABLE orders ADD COLUMN total REAL NOT NULL DEFAULT 0",
+            f"UPDATE orders SET total = {ORDER_TOTAL_SQL.format('orders.order_id')}",
+            "CREATE INDEX IF NOT EXISTS idx_orders_total ON orders(total, order_id)",
+            f"""CREATE TRIGGER IF NOT EXISTS trg_order_products_total_insert AFTER INSERT ON order_products BEGIN
+                UPDATE orders SET total = {ORDER_TOTAL_SQL.format('NEW.order_id')} WHERE order_id = NEW.order_id;
+            END""",
+            f"""CREATE TRIGGER IF NOT EXISTS trg_order_products_total_delete AFTER DELETE ON order_products BEGIN
+                UPDATE orders SET total = {ORDER_TOTAL_SQL.format('OLD.order_id')} WHERE order_id = OLD.order_id;
+            END""",
+            f"""CREATE TRIGGER IF NOT EXISTS trg_order_products_total_update
+            AFTER UPDATE OF order_id, quantity, unit_price ON order_products BEGIN
+                UPDATE orders SET total = {ORDER_TOTAL_SQL.format('OLD.order_id')} WHERE order_id = OLD.order_id;
+                UPDATE orders SET total = {ORDER_TOTAL_SQL.format('NEW.order_id')} WHERE order_id = NEW.order_id;
+            END""",
+        ],
+        "benchmarks": [
+            ("SELECT order_id, total FROM orders ORDER BY total DESC, order_id DESC LIMIT 100", (),
+             f"SELECT order_id, {ORDER_TOTAL_SQL.format('orders.order_id')} AS total FROM orders "
+             f"ORDER BY total DESC, order_id DESC LIMIT 100", ()),
+            ("SELECT order_id FROM orders WHERE total BETWEEN ? AND ?", (10000, 50000),
+             f"SELECT order_id FROM orders WHERE {ORDER_TOTAL_SQL.format('orders.order_id')} BETWEEN ? AND ?",
+             (10000, 50000)),
+        ],
+    },
+    {
+        "version": 6,
+        "description": "Полнотекстовый поиск FTS5 по клиентам и товарам",
+        "statements": _fts_statements("clients") + _fts_statements("products"),
+        "benchmarks": [
+            ("SELECT rowid FROM clients_fts WHERE clients_fts MATCH ?", ('"иван"*',),
+             "SELECT client_id FROM clients WHERE name LIKE ? OR email LIKE ? OR phone LIKE ?",
+             ("%иван%", "%иван%", "%иван%")),
+            ("SELECT rowid FROM products_fts WHERE products_fts MATCH ?", ('"ноут"*',),
+             "SELECT product_id FROM products WHERE name LIKE ?", ("%ноут%",)),
+        ],
+    },
+    {
+        "version": 7,
+        "description": "Триггеры data_version на таблицах данных (учёт изменений из других программ)",
+        "statements": _data_version_triggers(("clients", "products", "orders", "order_products")),
+        "benchmarks": [],
+    },
+    {
+        "version": 8,
+        "description": "Случайный идентификатор базы в data_version (отличает пересозданную базу с тем же путём)",
+        "statements": [
+            "ALTER TABLE data_version ADD COLUMN identity TEXT",
+            "UPDATE data_version SET identity = lower(hex(randomblob(16))) WHERE id = 1",
+        ],
+        "benchmarks": [],
+    },
+]
+AGGREGATES_SCHEMA = 2  # с этой версии схемы есть сводные таблицы AGGREGATE_TABLES
+DATA_VERSION_SCHEMA = 3  # с этой версии схемы есть таблица data_version
+DATA_VERSION_TRIGGERS_SCHEMA = 7  # с этой версии data_version увеличивают и триггеры
+DB_IDENTITY_SCHEMA = 8  # с этой версии в data_version хранится идентификатор базы
+SCHEMA_VERSION = MIGRATIONS[-1]["version"]
+DATA_TABLES = ("clients", "products", "orders", "order_products")
+
+IMPORT_BATCH_SIZE = 10000  # записей в одной транзакции массового импорта
+IMPORT_CONFLICT_POLICIES = ("skip", "upsert", "fail")
+MAX_REPORTED_ERRORS = 1000
+BUSY_TIMEOUT = 5.0  # секунд ожидания, пока база заблокирована другим соединением
+SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+EXPORT_CHUNK_SIZE = 5000  # строк, читаемых из курсора за один раз при экспорте
+CLIENT_COLUMNS = ("client_id", "name", "email", "phone")
+PRODUCT_COLUMNS = ("product_id", "name", "price")
+ORDER_LINES_CHUNK_SIZE = 50000  # строк позиций заказов в одной порции выборки
+ORDER_LINE_COLUMNS = ("order_id", "client_id", "client_name", "product_id",
+                      "product_name", "price", "quantity", "date", "status")
+ORDER_LINES_SQL = """
+    SELECT op.order_id, o.client_id, c.name AS client_name, op.product_id,
+           p.name AS product_name, op.unit_price AS price, op.quantity, o.date, o.status
+    FROM order_products op
+    JOIN orders o ON o.order_id = op.order_id
+    JOIN clients c ON c.client_id = o.client_id
+    JOIN products p ON p.product_id = op.product_id
+"""
+ORDER_QUANTITY_SCHEMA = 4  # версия схемы, с которой в order_products есть quantity и unit_price
+# До ORDER_QUANTITY_SCHEMA: одна штука по текущей цене товара (так же заполняет старые строки миграция 4)
+LEGACY_ORDER_LINES_SQL = ORDER_LINES_SQL.replace("op.unit_price AS price, op.quantity",
+                                                 "p.price AS price, 1 AS quantity")
+# Уникальные пары «клиент — товар» по позициям заказов (условия — по псевдонимам o и op)
+CLIENT_PRODUCT_PAIRS_SQL = """
+    SELECT DISTINCT o.client_id, op.product_id
+    FROM order_products op
+    JOIN orders o ON o.order_id = op.order_id
+"""
+
+
+def _order_lines_sql(schema_version: int) -> str:
+    """Запрос позиций заказов (столбцы ORDER_LINE_COLUMNS) для базы данной версии схемы."""
+    return ORDER_LINES_SQL if schema_version >= ORDER_QUANTITY_SCHEMA else LEGACY_ORDER_LINES_SQL
+
+
+TABLE_ENTITIES = {"clients": "client", "products": "product", "orders": "order"}
+ENTITY_CACHE_SIZE = 10000  # клиентов и товаров в кеше сущностей (см. EntityCache)
+
+
+class ImportReport:
+    """Итог массового импорта: сколько записей добавлено, обновлено, пропущено и отклонено."""
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.duplicates = 0  # пропущенные записи с существующим ключом (при upsert они входят в updated)
+        self.invalid = 0
+        self.errors: List[Tuple[int, str]] = []  # (номер записи, причина), не больше MAX_REPORTED_ERRORS
+        self.error_codes: Dict[int, int] = {}  # номер записи -> код ошибок контактных данных (models.CONTACT_*)
+        self.failed = False
+        self.error: Optional[str] = None
+
+    def add_invalid(self, position: int, reason: str, code: Optional[int] = None):
+        """Учитывает некорректную запись."""
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((position, reason))
+            if code is not None:
+                self.error_codes[position] = code
+
+    def fail(self, message: str):
+        """Отмечает, что импорт прерван."""
+        self.failed = True
+        self.error = message
+        print(message)
+
+    def __str__(self) -> str:
+        text = (f"Добавлено: {self.inserted}, обновлено: {self.updated}, "
+                f"дубликатов: {self.duplicates}, некорректных: {self.invalid}")
+        if self.failed:
+            text += f". Импорт прерван: {self.error}"
+        return text
+
+
+def _parse_client_record(position: int, row: dict, validate: bool = True):
+    """Проверяет запись клиента и возвращает (номер, значения, None, None)
+    или (номер, None, причина, код ошибок контактных данных или None).
+
+    validate=False проверяет только наличие полей, без формата email и телефона.
+    """
+    try:
+        values = (int(row["client_id"]), row["name"], row["email"], row["phone"])
+    except KeyError as e:
+        return position, None, f"нет поля {e}", None
+    except (TypeError, ValueError):
+        return position, None, "client_id должен быть целым числом", None
+    if validate:
+        code = contact_error_code(values[1], values[2], values[3])
+        if code != CONTACT_OK:
+            return position, None, describe_contact_errors(code), code
+    elif not all(values[1:]):
+        return position, None, "пустое имя, email или телефон", None
+    return position, values, None, None
+
+
+def _parse_product_record(position: int, item: dict):
+    """Проверяет запись товара и возвращает (номер, значения, None, None) или (номер, None, причина, None)."""
+    try:
+        values = (int(item["product_id"]), item["name"], float(item["price"]))
+    except KeyError as e:
+        return position, None, f"нет поля {e}", None
+    except (TypeError, ValueError):
+        return position, None, "product_id должен быть целым числом, price — числом", None
+    if not values[1]:
+        return position, None, "пустое название", None
+    if values[2] < 0:
+        return position, None, "отрицательная цена", None
+    return position, values, None, None
+
+
+def _parse_order_record(position: int, item: dict):
+    """Проверяет запись заказа и возвращает (номер, значения, None) или (номер, None, причина).
+
+    Значения — (order_id, client_id, дата, статус, список ID товаров); повтор ID товара
+    означает количество. Дата — datetime или строка ISO, статус по умолчанию «Новый».
+    """
+    try:
+        order_id = int(item["order_id"])
+        client_id = int(item["client_id"])
+        product_ids = [int(pid) for pid in item["product_ids"]]
+    except KeyError as e:
+        return position, None, f"нет поля {e}"
+    except (TypeError, ValueError):
+        return position, None, "order_id, client_id и ID товаров должны быть целыми числами"
+    if not product_ids:
+        return position, None, "в заказе нет товаров"
+    date = item.get("date") or datetime.now()
+    if not isinstance(date, datetime):
+        try:
+            date = datetime.fromisoformat(str(date))
+        except ValueError:
+            return position, None, f"некорректная дата {date!r}"
+    status = item.get("status") or "Новый"
+    return position, (order_id, client_id, date, status, product_ids), None
+
+
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def _iter_json_array(f, read_size: int = 1 << 16):
+    """Читает элементы JSON-массива из файла по одному, не загружая файл целиком.
+
+    Разбор идёт по позиции в буфере; уже разобранная часть отбрасывается
+    только при чтении следующего блока.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    expecting = "["
+
+    while True:
+        pos = _JSON_WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer):
+            if eof:
+                raise ValueError("неожиданный конец файла")
+            buffer, pos = f.read(read_size), 0
+            eof = not buffer
+            continue
+
+        char = buffer[pos]
+        if expecting == "[":
+            if char != "[":
+                raise ValueError("ожидался JSON-массив")
+            pos += 1
+            expecting = "value_or_end"
+        elif char == "]" and expecting in ("value_or_end", "comma_or_end"):
+            return
+        elif expecting == "comma_or_end":
+            if char != ",":
+                raise ValueError("ожидалась запятая между элементами")
+            pos += 1
+            expecting = "value"
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                value, end = None, None
+            # Значение, дошедшее до конца буфера (например, число), могло оборваться на границе блока
+            if end is None or (end == len(buffer) and not eof):
+                if eof:
+                    raise ValueError("некорректный элемент JSON-массива")
+                # Дочитываем не меньше, чем уже накоплено: повторный разбор длинного элемента остаётся линейным
+                chunk = f.read(max(read_size, len(buffer) - pos))
+                buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+                continue
+            yield value
+            pos = end
+            expecting = "comma_or_end"
+
+
+def _open_text(filepath: str, mode: str, compress: Optional[bool] = None):
+    """Открывает текстовый файл для импорта/экспорта; при compress (или расширении .gz) — через gzip."""
+    if compress is None:
+        compress = filepath.endswith(".gz")
+    if compress:
+        return gzip.open(filepath, mode + 't', compresslevel=6, newline='', encoding='utf-8')
+    return open(filepath, mode, newline='', encoding='utf-8')
+
+
+def _chunks(items: list, size: int):
+    """Разбивает список на последовательные части длиной не больше size."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def connect_read_only(db_name: str, timeout: float = BUSY_TIMEOUT) -> Connection:
+    """Открывает файл базы только для чтения (для потоков пула и процессов-обработчиков)."""
+    uri = Path(db_name).absolute().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, timeout=timeout, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def read_order_lines(db_name: str, condition: str = "", params: tuple = (),
+                     chunk_size: int = ORDER_LINES_CHUNK_SIZE, order_by: str = ""):
+    """Выдаёт позиции заказов порциями через собственное соединение только для чтения.
+
+    В отличие от Database.iter_order_lines не требует объекта Database, поэтому
+    подходит для других процессов. condition — условие WHERE по псевдонимам
+    o (orders) и op (order_products) с параметрами params, order_by — порядок
+    строк; чтобы не сортировать во временном B-дереве, он должен совпадать с
+    индексом, по которому выбираются строки условия.
+    """
+    conn = connect_read_only(db_name)
+    try:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        schema_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        query = _order_lines_sql(schema_version) + (f" WHERE {condition}" if condition else "")
+        cursor.execute(query + (f" ORDER BY {order_by}" if order_by else ""), params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+def read_client_product_pairs(db_name: str, condition: str = "", params: tuple = ()) -> List[Tuple[int, int]]:
+    """Возвращает уникальные пары (client_id, product_id) через соединение только для чтения."""
+    conn = connect_read_only(db_name)
+    try:
+        query = CLIENT_PRODUCT_PAIRS_SQL + (f" WHERE {condition}" if condition else "")
+        return [tuple(row) for row in conn.execute(query, params)]
+    finally:
+        conn.close()
+
+
+def _select_by_ids(cursor, query: str, ids: Iterable[int]) -> list:
+    """Выполняет query с {} на месте списка IN для уникальных ids частями по SQL_CHUNK_SIZE
+    и возвращает все найденные строки."""
+    rows = []
+    for chunk in _chunks(list(dict.fromkeys(ids)), SQL_CHUNK_SIZE):
+        cursor.execute(query.format(", ".join("?" * len(chunk))), chunk)
+        rows.extend(cursor.fetchall())
+    return rows
+
+
+class EntityCache:
+    """Кеш клиентов и товаров по ID (identity map) с вытеснением давно не использованных (LRU).
+
+    Повторные запросы одного клиента или товара возвращают тот же объект без
+    обращения к базе. Database сбрасывает записи при добавлении, импорте и
+    удалении; изменения, сделанные в обход этого объекта Database (другим
+    процессом), кеш не замечает.
+
+    Читающий поток берёт generation() до запроса к базе и передаёт её в put():
+    если за это время записи сбрасывались, прочитанный объект мог устареть
+    и в кеш не попадает.
+    """
+    def __init__(self, max_entries: int = ENTITY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (сущность, ID) -> объект
+        self._generation = 0  # растёт при каждом сбросе записей
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        """Возвращает номер сброса; его нужно получить до чтения объекта из базы."""
+        with self._lock:
+            return self._generation
+
+    def get(self, entity: str, key: int):
+        """Возвращает объект из кеша или None."""
+        with self._lock:
+            value = self._entries.get((entity, key))
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((entity, key))
+            self.hits += 1
+            return value
+
+    def put(self, entity: str, key: int, value, generation: Optional[int] = None) -> None:
+        """Запоминает объект, вытесняя самые старые записи сверх max_entries.
+
+        Если задан generation и с тех пор записи сбрасывались, объект не запоминается.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[(entity, key)] = value
+            self._entries.move_to_end((entity, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, entity: str, keys: Iterable[int]) -> None:
+        """Удаляет записи сущности entity с указанными ID."""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop((entity, key), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Возвращает число попаданий, промахов и записей в кеше."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+class OrderQuery:
+    """Составной запрос заказов: фильтры добавляются цепочкой вызовов, условия объединяются через AND.
+
+    Значения передаются в SQL только параметрами. Пример:
+    OrderQuery().client(5).statuses(["Новый"]).date_range(date(2025, 1, 1), None).order_by("total")
+    """
+    def __init__(self, sort_by: str = "date", descending: bool = True):
+        self.sort_by = "date"
+        self.descending = True
+        self.impossible = False  # True, если фильтр заведомо ничего не найдёт
+        self._conditions: List[str] = []
+        self._params: list = []
+        self.order_by(sort_by, descending)
+
+    def _where(self, condition: str, *params) -> "OrderQuery":
+        self._conditions.append(condition)
+        self._params.extend(params)
+        return self
+
+    def client(self, client_id: int) -> "OrderQuery":
+        """Заказы клиента client_id."""
+        return self._where("client_id = ?", client_id)
+
+    def statuses(self, statuses: Iterable[str]) -> "OrderQuery":
+        """Заказы с одним из статусов statuses."""
+        statuses = list(statuses)
+        if not statuses:
+            self.impossible = True
+            return self
+        return self._where(f"status IN ({', '.join('?' * len(statuses))})", *statuses)
+
+    def date_range(self, start: Optional[date] = None, end: Optional[date] = None) -> "OrderQuery":
+        """Заказы не раньше start и не позже end (границы включаются; дата без времени — весь день)."""
+        if start is not None:
+            self._where("date >= ?", start.isoformat())
+        if end is not None:
+            if isinstance(end, datetime):
+                self._where("date <= ?", end.isoformat())
+            else:
+                self._where("date < ?", (end + timedelta(days=1)).isoformat())
+        return self
+
+    def product(self, product_id: int) -> "OrderQuery":
+        """Заказы, в которых есть товар product_id."""
+        return self._where("order_id IN (SELECT order_id FROM order_products WHERE product_id = ?)", product_id)
+
+    def total_range(self, min_total: Optional[float] = None, max_total: Optional[float] = None) -> "OrderQuery":
+        """Заказы с суммой в диапазоне [min_total, max_total] (по индексу idx_orders_total)."""
+        if min_total is not None:
+            self._where("total >= ?", min_total)
+        if max_total is not None:
+            self._where("total <= ?", max_total)
+        return self
+
+    def search(self, text: str) -> "OrderQuery":
+        """Заказы, у которых клиент или один из товаров подходит под строку поиска (FTS5)."""
+        match = _fts_query(text)
+        if match is None:
+            self.impossible = True
+            return self
+        return self._where(ORDER_SEARCH_CONDITION, match, match)
+
+    def order_by(self, sort_by: str, descending: bool = True) -> "OrderQuery":
+        """Задаёт сортировку: "date" или "total"."""
+        self.sort_by = sort_by if sort_by in ORDER_SORT_FIELDS else "date"
+        self.descending = descending
+        return self
+
+    def where_sql(self, after: Optional[Tuple] = None) -> Tuple[str, list]:
+        """Возвращает условие WHERE (или пустую строку) и его параметры.
+
+        after — курсор (значение ключа сортировки, order_id) для постраничного чтения.
+        """
+        conditions = list(self._conditions)
+        params = list(self._params)
+        if after is not None:
+            key = ORDER_SORT_FIELDS[self.sort_by]
+            conditions.append(f"({key}, order_id) {'<' if self.descending else '>'} (?, ?)")
+            params.extend(after)
+        if not conditions:
+            return "", params
+        return " WHERE " + " AND ".join(conditions), params
+
+    def order_sql(self) -> str:
+        """Возвращает ORDER BY для выбранной сортировки (order_id — для однозначного порядка)."""
+        key = ORDER_SORT_FIELDS[self.sort_by]
+        direction = "DESC" if self.descending else "ASC"
+        return f" ORDER BY {key} {direction}, order_id {direction}"
+
 
 class Database:
     """Класс для работы с SQLite базой данных интернет-магазина"""
-    def __init__(self, db_name: str = DB_NAME):
+    def __init__(self, db_name: str = DB_NAME, schema_version: Optional[int] = None,
+                 pooled: bool = False, synchronous: Optional[str] = None,
+                 busy_timeout: float = BUSY_TIMEOUT, product_registry: Optional[ProductRegistry] = None,
+                 entity_cache_size: int = 0):
+        """pooled=True включает режим пула: журнал WAL, одно соединение на запись,
+        защищённое блокировкой, и отдельные соединения только для чтения в каждом потоке.
+        В этом режиме объект можно использовать из нескольких потоков.
+        synchronous — значение PRAGMA synchronous (OFF, NORMAL, FULL, EXTRA);
+        в режиме пула по умолчанию NORMAL. busy_timeout — ожидание блокировки в секундах.
+        product_registry — реестр, через который товары заказов разделяются между
+        всеми загрузками заказов (по умолчанию только в пределах одного запроса).
+        entity_cache_size > 0 включает EntityCache этого размера для get_client(s)
+        и get_product(s)."""
         self.db_name = db_name
+        self.product_registry = product_registry
+        self.entity_cache = EntityCache(entity_cache_size) if entity_cache_size > 0 else None
         self.conn: Optional[Connection] = None
+        self.pooled = pooled and db_name != ":memory:"
+        self.synchronous = synchronous or ("NORMAL" if self.pooled else None)
+        self.busy_timeout = busy_timeout
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._read_conns: List[Connection] = []
+        self._read_conns_lock = threading.Lock()
+        self._subscribers: List[Callable] = []
+        self._versioned = False
+        self._identified = False
+        self._fts = False
         self.connect()
-        self.create_tables()
+        self.create_tables(schema_version)
 
     def connect(self):
         """Устанавливает соединение с базой данных SQLite."""
         try:
-            self.conn = sqlite3.connect(self.db_name)
+            self.conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout,
+                                        check_same_thread=not self.pooled)
             self.conn.row_factory = sqlite3.Row
+            if self.pooled:
+                self.conn.execute("PRAGMA journal_mode = WAL")
+            if self.synchronous:
+                if self.synchronous.upper() not in SYNCHRONOUS_LEVELS:
+                    raise ValueError(f"Недопустимый уровень synchronous: {self.synchronous}")
+                self.conn.execute(f"PRAGMA synchronous = {self.synchronous.upper()}")
         except sqlite3.Error as e:
             print(f"Ошибка подключения к базе данных: {e}")
 
     def close(self):
-        """Закрывает соединение с базой данных."""
+        """Закрывает соединение с базой данных и соединения пула для чтения."""
+        with self._read_conns_lock:
+            for conn in self._read_conns:
+                conn.close()
+            self._read_conns.clear()
+        self._local = threading.local()
         if self.conn:
             self.conn.close()
 
-    def create_tables(self):
-        """Создаёт таблицы clients, products, orders и order_products, если их нет."""
+    @contextmanager
+    def _writer(self):
+        """Выдаёт единственное соединение на запись под блокировкой.
+
+        При успешном выходе транзакция фиксируется, при исключении — откатывается.
+        Если транзакция изменила данные, в ней же увеличивается счётчик data_version.
+        """
+        with self._write_lock:
+            changes = self.conn.total_changes
+            try:
+                yield self.conn
+                if self._versioned and self.conn.total_changes != changes:
+                    self.conn.execute("UPDATE data_version SET version = version + 1 WHERE id = 1")
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+    def get_data_version(self) -> Optional[int]:
+        """Возвращает счётчик версии данных: он растёт с каждой транзакцией, изменившей базу
+        через Database (в том числе в другом процессе). Начиная со схемы
+        DATA_VERSION_TRIGGERS_SCHEMA его увеличивают и триггеры на таблицах данных, поэтому
+        учитываются и изменения сторонними программами (например, консолью sqlite3);
+        в более старых схемах такие изменения не видны.
+        None, если схема базы старше DATA_VERSION_SCHEMA."""
+        if not self._versioned:
+            return None
+        try:
+            row = self._reader().execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            print(f"Ошибка чтения версии данных: {e}")
+            return None
+
+    def get_db_identity(self) -> Optional[str]:
+        """Возвращает случайный идентификатор, созданный вместе с базой (миграцией DB_IDENTITY_SCHEMA).
+
+        Пересозданная по тому же пути база получает новый идентификатор, поэтому
+        вместе с get_data_version он однозначно определяет состояние данных.
+        None, если схема базы старше DB_IDENTITY_SCHEMA."""
+        if not self._identified:
+            return None
+        try:
+            row = self._reader().execute("SELECT identity FROM data_version WHERE id = 1").fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            print(f"Ошибка чтения идентификатора базы: {e}")
+            return None
+
+    def subscribe(self, callback: Callable) -> None:
+        """Подписывает callback(entity, action, ids) на изменения данных.
+
+        entity — "client", "product" или "order"; action — "add", "update",
+        "delete" или "import" (массовый импорт: строки с этими id могли быть
+        добавлены или изменены); ids — список затронутых идентификаторов.
+        Вызывается после фиксации транзакции в потоке, который изменил данные.
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable) -> None:
+        """Отменяет подписку на изменения данных."""
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _notify(self, entity: str, action: str, ids: list) -> None:
+        """Сбрасывает изменённых клиентов и товары в кеше сущностей и сообщает подписчикам
+        об изменении данных; ошибки подписчиков не прерывают операцию."""
+        if self.entity_cache is not None and entity in ("client", "product"):
+            self.entity_cache.invalidate(entity, ids)
+        for callback in list(self._subscribers):
+            try:
+                callback(entity, action, ids)
+            except Exception as e:
+                print(f"Ошибка обработчика изменений: {e}")
+
+    def _reader(self) -> Connection:
+        """Возвращает соединение для чтения: своё для каждого потока в режиме пула, иначе общее."""
+        if not self.pooled:
+            return self.conn
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect_read_only(self.db_name, self.busy_timeout)
+            self._local.conn = conn
+            with self._read_conns_lock:
+                self._read_conns.append(conn)
+        return conn
+
+    def create_tables(self, schema_version: Optional[int] = None):
+        """Создаёт таблицы clients, products, orders и order_products, если их нет,
+        и применяет миграции схемы до версии schema_version (по умолчанию до последней)."""
         try:
             cursor = self.conn.cursor()
             cursor.execute("""
@@ -75,16 +947,107 @@ class Database:
             self.conn.commit()
         except sqlite3.Error as e:
             print(f"Ошибка при создании таблиц: {e}")
+            return
+        self.migrate(schema_version)
+
+    def get_schema_version(self) -> int:
+        """Возвращает текущую версию схемы базы (PRAGMA user_version)."""
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self, target_version: Optional[int] = None) -> int:
+        """Применяет недостающие миграции из MIGRATIONS, каждую в отдельной транзакции.
+
+        Возвращает версию схемы после применения.
+        """
+        if target_version is None:
+            target_version = SCHEMA_VERSION
+        version = self.get_schema_version()
+        for migration in MIGRATIONS:
+            if migration["version"] <= version or migration["version"] > target_version:
+                continue
+            try:
+                with self._writer() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("BEGIN")
+                    for statement in migration["statements"]:
+                        cursor.execute(statement)
+                    cursor.execute(f"PRAGMA user_version = {migration['version']}")
+                version = migration["version"]
+            except sqlite3.Error as e:
+                print(f"Ошибка применения миграции {migration['version']} "
+                      f"({migration['description']}): {e}")
+                break
+        self._versioned = version >= DATA_VERSION_SCHEMA
+        self._identified = version >= DB_IDENTITY_SCHEMA
+        self._fts = version >= FTS_SCHEMA
+        return version
+
+    def explain(self, query: str, params: tuple = ()) -> List[str]:
+        """Возвращает план выполнения запроса (EXPLAIN QUERY PLAN) построчно."""
+        rows = self._reader().execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        return [row["detail"] for row in rows]
+
+    def rebuild_aggregates(self) -> bool:
+        """Пересчитывает сводные таблицы (AGGREGATE_TABLES) по исходным данным в одной транзакции."""
+        try:
+            with self._writer() as conn:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN")
+                for statement in AGGREGATE_REBUILD_SQL:
+                    cursor.execute(statement)
+            return True
+        except sqlite3.Error as e:
+            print(f"Ошибка пересчёта сводных таблиц: {e}")
+            return False
+
+    def get_top_clients_by_orders(self, top_n: int = 5) -> List[Tuple[int, str, int]]:
+        """Возвращает топ N клиентов по числу заказов из сводной таблицы: (client_id, name, order_count)."""
+        try:
+            cursor = self._reader().cursor()
+            cursor.execute("""
+                SELECT s.client_id, c.name, s.order_count FROM client_order_stats s
+                JOIN clients c ON c.client_id = s.client_id
+                ORDER BY s.order_count DESC, s.client_id LIMIT ?
+            """, (top_n,))
+            return [tuple(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Ошибка получения статистики по клиентам: {e}")
+            return []
+
+    def get_daily_order_stats(self) -> List[Tuple[str, int, float]]:
+        """Возвращает число заказов и выручку по дням из сводной таблицы: (day, order_count, revenue)."""
+        try:
+            cursor = self._reader().cursor()
+            cursor.execute("SELECT day, order_count, revenue FROM daily_order_stats ORDER BY day")
+            return [tuple(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Ошибка получения статистики по дням: {e}")
+            return []
+
+    def get_product_sales_stats(self) -> List[Tuple[int, str, int, float]]:
+        """Возвращает продажи товаров из сводной таблицы: (product_id, name, units, revenue), по убыванию выручки."""
+        try:
+            cursor = self._reader().cursor()
+            cursor.execute("""
+                SELECT s.product_id, p.name, s.units, s.revenue FROM product_sales_stats s
+                JOIN products p ON p.product_id = s.product_id
+                ORDER BY s.revenue DESC, s.product_id
+            """)
+            return [tuple(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            print(f"Ошибка получения статистики по товарам: {e}")
+            return []
 
     def add_client(self, client: Client) -> bool:
         """Добавляет клиента в базу."""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                INSERT INTO clients (client_id, name, email, phone)
-                VALUES (?, ?, ?, ?)
-            """, (client.client_id, client.name, client.email, client.phone))
-            self.conn.commit()
+            with self._writer() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO clients (client_id, name, email, phone)
+                    VALUES (?, ?, ?, ?)
+                """, (client.client_id, client.name, client.email, client.phone))
+            self._notify("client", "add", [client.client_id])
             return True
         except sqlite3.IntegrityError:
             print(f"Клиент с client_id={client.client_id} уже существует.")
@@ -94,13 +1057,22 @@ class Database:
             return False
 
     def get_client(self, client_id: int) -> Optional[Client]:
-        """Получает клиента по ID."""
+        """Получает клиента по ID (из кеша сущностей, если он включён)."""
+        generation = None
+        if self.entity_cache is not None:
+            client = self.entity_cache.get("client", client_id)
+            if client is not None:
+                return client
+            generation = self.entity_cache.generation()
         try:
-            cursor = self.conn.cursor()
+            cursor = self._reader().cursor()
             cursor.execute("SELECT * FROM clients WHERE client_id = ?", (client_id,))
             row = cursor.fetchone()
             if row:
-                return Client(row["client_id"], row["name"], row["email"], row["phone"])
+                client = Client(row["client_id"], row["name"], row["email"], row["phone"])
+                if self.entity_cache is not None:
+                    self.entity_cache.put("client", client_id, client, generation)
+                return client
             return None
         except sqlite3.Error as e:
             print(f"Ошибка получения клиента: {e}")
@@ -111,7 +1083,7 @@ class Database:
 
         clients = []
         try:
-            cursor = self.conn.cursor()
+            cursor = self._reader().cursor()
             cursor.execute("SELECT * FROM clients")
             rows = cursor.fetchall()
             for row in rows:
@@ -120,31 +1092,108 @@ class Database:
             print(f"Ошибка получения клиентов: {e}")
         return clients
 
+    def get_clients_page(self, limit: int, offset: int = 0) -> List[Client]:
+        """Получает страницу клиентов в порядке client_id."""
+        clients = []
+        try:
+            cursor = self._reader().cursor()
+            cursor.execute("SELECT * FROM clients ORDER BY client_id LIMIT ? OFFSET ?", (limit, offset))
+            for row in cursor.fetchall():
+                clients.append(Client(row["client_id"], row["name"], row["email"], row["phone"]))
+        except sqlite3.Error as e:
+            print(f"Ошибка получения клиентов: {e}")
+        return clients
+
+    def count_clients(self) -> int:
+        """Возвращает число клиентов."""
+        return self._count("clients")
+
+    def _count(self, table: str) -> int:
+        """Возвращает число строк в таблице."""
+        try:
+            return self._reader().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Ошибка подсчёта строк в {table}: {e}")
+            return 0
+
+    def get_clients(self, client_ids: Iterable[int]) -> Dict[int, Client]:
+        """Получает клиентов по списку ID запросами IN; возвращает словарь ID -> клиент.
+        Клиенты из кеша сущностей в базе не запрашиваются."""
+        clients, missing, generation = self._cached("client", client_ids)
+        try:
+            rows = _select_by_ids(self._reader().cursor(), "SELECT * FROM clients WHERE client_id IN ({})", missing)
+        except sqlite3.Error as e:
+            print(f"Ошибка получения клиентов: {e}")
+            return clients
+        for row in rows:
+            clients[row["client_id"]] = Client(row["client_id"], row["name"], row["email"], row["phone"])
+            if self.entity_cache is not None:
+                self.entity_cache.put("client", row["client_id"], clients[row["client_id"]], generation)
+        return clients
+
+    def _cached(self, entity: str, ids: Iterable[int]) -> Tuple[dict, list, Optional[int]]:
+        """Делит ids на найденные в кеше сущностей (словарь) и остальные (список);
+        третий элемент — номер сброса кеша для put() прочитанных из базы объектов."""
+        ids = list(dict.fromkeys(ids))
+        if self.entity_cache is None:
+            return {}, ids, None
+        generation = self.entity_cache.generation()
+        found, missing = {}, []
+        for key in ids:
+            value = self.entity_cache.get(entity, key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        return found, missing, generation
+
     def delete_client(self, client_id: int) -> bool:
         """Удаляет клиента и связанные с ним заказы."""
+        return self.delete_clients([client_id]) is not None
+
+    def delete_clients(self, client_ids: Iterable[int]) -> Optional[int]:
+        """Удаляет клиентов вместе с их заказами одной транзакцией.
+
+        Позиции, заказы и клиенты удаляются тремя запросами DELETE ... IN на каждые
+        SQL_CHUNK_SIZE ID (позиции раньше заказов — этого ждут триггеры сводных таблиц).
+        Подписчики получают только ID клиентов, которые действительно были в базе.
+        Возвращает число удалённых клиентов или None при ошибке.
+        """
+        client_ids = list(dict.fromkeys(client_ids))
+        order_ids = []
+        deleted = []
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT order_id FROM orders WHERE client_id = ?", (client_id,))
-            order_ids = [row["order_id"] for row in cursor.fetchall()]
-            for oid in order_ids:
-                cursor.execute("DELETE FROM order_products WHERE order_id = ?", (oid,))
-            cursor.execute("DELETE FROM orders WHERE client_id = ?", (client_id,))
-            cursor.execute("DELETE FROM clients WHERE client_id = ?", (client_id,))
-            self.conn.commit()
-            return True
+            with self._writer() as conn:
+                cursor = conn.cursor()
+                for chunk in _chunks(client_ids, SQL_CHUNK_SIZE):
+                    placeholders = ", ".join("?" * len(chunk))
+                    cursor.execute(f"SELECT client_id FROM clients WHERE client_id IN ({placeholders})", chunk)
+                    deleted.extend(row["client_id"] for row in cursor.fetchall())
+                    cursor.execute(f"SELECT order_id FROM orders WHERE client_id IN ({placeholders})", chunk)
+                    order_ids.extend(row["order_id"] for row in cursor.fetchall())
+                    cursor.execute(f"DELETE FROM order_products WHERE order_id IN "
+                                   f"(SELECT order_id FROM orders WHERE client_id IN ({placeholders}))", chunk)
+                    cursor.execute(f"DELETE FROM orders WHERE client_id IN ({placeholders})", chunk)
+                    cursor.execute(f"DELETE FROM clients WHERE client_id IN ({placeholders})", chunk)
         except sqlite3.Error as e:
-            print(f"Ошибка при удалении клиента: {e}")
-            return False
+            print(f"Ошибка при удалении клиентов: {e}")
+            return None
+        if order_ids:
+            self._notify("order", "delete", order_ids)
+        if deleted:
+            self._notify("client", "delete", deleted)
+        return len(deleted)
 
     def add_product(self, product: Product) -> bool:
         """Добавляет товар в базу."""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                INSERT INTO products (product_id, name, price)
-                VALUES (?, ?, ?)
-            """, (product.product_id, product.name, product.price))
-            self.conn.commit()
+            with self._writer() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO products (product_id, name, price)
+                    VALUES (?, ?, ?)
+                """, (product.product_id, product.name, product.price))
+            self._notify("product", "add", [product.product_id])
             return True
         except sqlite3.IntegrityError:
             print(f"Товар с product_id={product.product_id} уже существует.")
@@ -154,23 +1203,47 @@ class Database:
             return False
 
     def get_product(self, product_id: int) -> Optional[Product]:
-        """Получает товар по ID."""
+        """Получает товар по ID (из кеша сущностей, если он включён)."""
+        generation = None
+        if self.entity_cache is not None:
+            product = self.entity_cache.get("product", product_id)
+            if product is not None:
+                return product
+            generation = self.entity_cache.generation()
         try:
-            cursor = self.conn.cursor()
+            cursor = self._reader().cursor()
             cursor.execute("SELECT * FROM products WHERE product_id = ?", (product_id,))
             row = cursor.fetchone()
             if row:
-                return Product(row["product_id"], row["name"], row["price"])
+                product = self._make_product(row["product_id"], row["name"], row["price"])
+                if self.entity_cache is not None:
+                    self.entity_cache.put("product", product_id, product, generation)
+                return product
             return None
         except sqlite3.Error as e:
             print(f"Ошибка получения товара: {e}")
             return None
 
+    def get_products(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        """Получает товары по списку ID запросами IN; возвращает словарь ID -> товар.
+        Товары из кеша сущностей в базе не запрашиваются."""
+        products, missing, generation = self._cached("product", product_ids)
+        try:
+            rows = _select_by_ids(self._reader().cursor(), "SELECT * FROM products WHERE product_id IN ({})", missing)
+        except sqlite3.Error as e:
+            print(f"Ошибка получения товаров: {e}")
+            return products
+        for row in rows:
+            products[row["product_id"]] = self._make_product(row["product_id"], row["name"], row["price"])
+            if self.entity_cache is not None:
+                self.entity_cache.put("product", row["product_id"], products[row["product_id"]], generation)
+        return products
+
     def get_all_products(self) -> List[Product]:
         """Получает список всех товаров."""
         products = []
         try:
-            cursor = self.conn.cursor()
+            cursor = self._reader().cursor()
             cursor.execute("SELECT * FROM products")
             rows = cursor.fetchall()
             for row in rows:
@@ -179,33 +1252,75 @@ class Database:
             print(f"Ошибка получения товаров: {e}")
         return products
 
+    def get_products_page(self, limit: int, offset: int = 0) -> List[Product]:
+        """Получает страницу товаров в порядке product_id."""
+        products = []
+        try:
+            cursor = self._reader().cursor()
+            cursor.execute("SELECT * FROM products ORDER BY product_id LIMIT ? OFFSET ?", (limit, offset))
+            for row in cursor.fetchall():
+                products.append(Product(row["product_id"], row["name"], row["price"]))
+        except sqlite3.Error as e:
+            print(f"Ошибка получения товаров: {e}")
+        return products
+
+    def count_products(self) -> int:
+        """Возвращает число товаров."""
+        return self._count("products")
+
     def delete_product(self, product_id: int) -> bool:
         """Удаляет товар и связанные с ним записи в заказах."""
+        return self.delete_products([product_id]) is not None
+
+    def delete_products(self, product_ids: Iterable[int]) -> Optional[int]:
+        """Удаляет товары и их позиции в заказах одной транзакцией.
+
+        На каждые SQL_CHUNK_SIZE ID выполняются два запроса DELETE ... IN
+        (позиции ищутся по индексу idx_order_products_product_id); заказы
+        остаются, их суммы пересчитывают триггеры. Подписчики получают только
+        ID товаров, которые действительно были в базе.
+        Возвращает число удалённых товаров или None при ошибке.
+        """
+        product_ids = list(dict.fromkeys(product_ids))
+        order_ids = set()
+        deleted = []
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("DELETE FROM order_products WHERE product_id = ?", (product_id,))
-            cursor.execute("DELETE FROM products WHERE product_id = ?", (product_id,))
-            self.conn.commit()
-            return True
+            with self._writer() as conn:
+                cursor = conn.cursor()
+                for chunk in _chunks(product_ids, SQL_CHUNK_SIZE):
+                    placeholders = ", ".join("?" * len(chunk))
+                    cursor.execute(f"SELECT product_id FROM products WHERE product_id IN ({placeholders})", chunk)
+                    deleted.extend(row["product_id"] for row in cursor.fetchall())
+                    cursor.execute(f"SELECT DISTINCT order_id FROM order_products "
+                                   f"WHERE product_id IN ({placeholders})", chunk)
+                    order_ids.update(row["order_id"] for row in cursor.fetchall())
+                    cursor.execute(f"DELETE FROM order_products WHERE product_id IN ({placeholders})", chunk)
+                    cursor.execute(f"DELETE FROM products WHERE product_id IN ({placeholders})", chunk)
         except sqlite3.Error as e:
-            print(f"Ошибка при удалении товара: {e}")
-            return False
+            print(f"Ошибка при удалении товаров: {e}")
+            return None
+        if deleted:
+            self._notify("product", "delete", deleted)
+        if order_ids:
+            self._notify("order", "update", sorted(order_ids))
+        return len(deleted)
 
     def add_order(self, order: Order) -> bool:
-        """Добавляет заказ с товарами в базу."""
+        """Добавляет заказ с позициями в базу; количество и цена позиций сохраняются как есть."""
 
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("""
-                INSERT INTO orders (order_id, client_id, date, status)
-                VALUES (?, ?, ?, ?)
-            """, (order.order_id, order.client.client_id, order.date.isoformat(), order.status))
-            for product in order.products:
+            with self._writer() as conn:
+                cursor = conn.cursor()
                 cursor.execute("""
-                    INSERT INTO order_products (order_id, product_id)
-                    VALUES (?, ?)
-                """, (order.order_id, product.product_id))
-            self.conn.commit()
+                    INSERT INTO orders (order_id, client_id, date, status)
+                    VALUES (?, ?, ?, ?)
+                """, (order.order_id, order.client.client_id, order.date.isoformat(), order.status))
+                cursor.executemany("""
+                    INSERT INTO order_products (order_id, product_id, quantity, unit_price)
+                    VALUES (?, ?, ?, ?)
+                """, [(order.order_id, item.product.product_id, item.quantity, item.unit_price)
+                      for item in order_items(order.items)])
+            self._notify("order", "add", [order.order_id])
             return True
         except sqlite3.IntegrityError:
             print(f"Заказ с order_id={order.order_id} уже существует.")
@@ -214,48 +1329,218 @@ class Database:
             print(f"Ошибка добавления заказа: {e}")
             return False
 
+    def add_orders(self, orders: Iterable[dict]) -> List[Tuple[int, Optional[int], Optional[str]]]:
+        """Добавляет пакет заказов одной транзакцией.
+
+        orders — словари с ключами order_id, client_id, product_ids (повтор ID —
+        количество), date и status (необязательны). Клиенты, товары и занятые
+        order_id проверяются запросами IN сразу для всего пакета, заказы и позиции
+        вставляются через executemany по текущим ценам товаров.
+        Возвращает по записи на заказ: (номер записи, order_id, None) при успехе
+        или (номер записи, order_id или None, причина) для отклонённого заказа.
+        """
+        results = []
+        parsed = []
+        for position, values, error in (_parse_order_record(i, item) for i, item in enumerate(orders, start=1)):
+            if values is None:
+                results.append((position, None, error))
+            else:
+                parsed.append((position, values))
+        if not parsed:
+            return results
+
+        accepted = []
+        try:
+            with self._writer() as conn:
+                cursor = conn.cursor()
+                clients = {row["client_id"]: Client(row["client_id"], row["name"], row["email"], row["phone"])
+                           for row in _select_by_ids(cursor, "SELECT * FROM clients WHERE client_id IN ({})",
+                                                     {values[1] for _, values in parsed})}
+                products = {row["product_id"]: self._make_product(row["product_id"], row["name"], row["price"])
+                            for row in _select_by_ids(cursor, "SELECT * FROM products WHERE product_id IN ({})",
+                                                      {pid for _, values in parsed for pid in values[4]})}
+                taken = {row[0] for row in _select_by_ids(cursor, "SELECT order_id FROM orders WHERE order_id IN ({})",
+                                                          {values[0] for _, values in parsed})}
+
+                for position, (order_id, client_id, date, status, product_ids) in parsed:
+                    missing = [pid for pid in dict.fromkeys(product_ids) if pid not in products]
+                    if order_id in taken:
+                        results.append((position, order_id, f"заказ с order_id={order_id} уже существует"))
+                    elif client_id not in clients:
+                        results.append((position, order_id, f"клиент с ID {client_id} не найден"))
+                    elif missing:
+                        results.append((position, order_id, f"товары не найдены: {', '.join(map(str, missing))}"))
+                    else:
+                        taken.add(order_id)
+                        accepted.append((position, Order(order_id, clients[client_id],
+                                                         [products[pid] for pid in product_ids], date, status)))
+
+                cursor.executemany("""
+                    INSERT INTO orders (order_id, client_id, date, status)
+                    VALUES (?, ?, ?, ?)
+                """, [(order.order_id, order.client.client_id, order.date.isoformat(), order.status)
+                      for _, order in accepted])
+                cursor.executemany("""
+                    INSERT INTO order_products (order_id, product_id, quantity, unit_price)
+                    VALUES (?, ?, ?, ?)
+                """, [(order.order_id, item.product.product_id, item.quantity, item.unit_price)
+                      for _, order in accepted for item in order.items])
+        except sqlite3.Error as e:
+            print(f"Ошибка добавления заказов: {e}")
+            positions = {position for position, _ in parsed}
+            results = [result for result in results if result[0] not in positions]
+            results.extend((position, values[0], f"пакет отменён: {e}") for position, values in parsed)
+            return sorted(results, key=lambda result: result[0])
+
+        results.extend((position, order.order_id, None) for position, order in accepted)
+        if accepted:
+            self._notify("order", "add", [order.order_id for _, order in accepted])
+        return sorted(results, key=lambda result: result[0])
+
     def get_order(self, order_id: int) -> Optional[Order]:
         """Получает заказ по ID."""
         try:
-            cursor = self.conn.cursor()
+            cursor = self._reader().cursor()
             cursor.execute("SELECT * FROM orders WHERE order_id = ?", (order_id,))
             order_row = cursor.fetchone()
             if not order_row:
                 return None
             client = self.get_client(order_row["client_id"])
-            cursor.execute("SELECT p.product_id, p.name, p.price FROM products p "
+            cursor.execute("SELECT p.product_id, p.name, p.price, op.quantity, op.unit_price FROM products p "
                            "JOIN order_products op ON p.product_id = op.product_id "
                            "WHERE op.order_id = ?", (order_id,))
-            products_rows = cursor.fetchall()
-            products = [Product(row["product_id"], row["name"], row["price"]) for row in products_rows]
+            items = [OrderItem(self._make_product(row["product_id"], row["name"], row["price"]),
+                               row["quantity"], row["unit_price"]) for row in cursor.fetchall()]
             date = datetime.fromisoformat(order_row["date"])
             status = order_row["status"]
-            return Order(order_row["order_id"], client, products, date, status)
+            return Order(order_row["order_id"], client, items, date, status)
         except sqlite3.Error as e:
             print(f"Ошибка получения заказа: {e}")
             return None
 
+    def get_order_total(self, order_id: int) -> float:
+        """Возвращает сумму заказа по ценам на момент заказа одним агрегатным запросом."""
+        try:
+            row = self._reader().execute(f"SELECT {ORDER_TOTAL_SQL.format('?')}", (order_id,)).fetchone()
+            return row[0]
+        except sqlite3.Error as e:
+            print(f"Ошибка расчёта суммы заказа: {e}")
+            return 0.0
+
+    def _make_product(self, product_id: int, name: str, price: float) -> Product:
+        """Создаёт товар или берёт общий объект из product_registry, если он задан."""
+        if self.product_registry is not None:
+            return self.product_registry.intern(product_id, name, price)
+        return Product(product_id, name, price)
+
     def get_all_orders(self) -> List[Order]:
+        """Получает все заказы за фиксированное число запросов (заказы, клиенты, позиции)."""
         orders = []
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT order_id FROM orders")
-            order_ids = [row["order_id"] for row in cursor.fetchall()]
-            for oid in order_ids:
-                order = self.get_order(oid)
-                if order:
-                    orders.append(order)
+            cursor = self._reader().cursor()
+            cursor.execute("SELECT * FROM orders")
+            order_rows = cursor.fetchall()
+            orders = self._hydrate_orders(cursor, order_rows, scope_sql="SELECT * FROM orders")
         except sqlite3.Error as e:
             print(f"Ошибка получения заказов: {e}")
         return orders
 
+    def _hydrate_orders(self, cursor, order_rows, scope_sql: Optional[str] = None,
+                        scope_params: tuple = ()) -> List[Order]:
+        """Собирает объекты Order из строк таблицы orders пакетными запросами.
+
+        Клиенты, товары и одинаковые позиции загружаются один раз и разделяются между заказами.
+        Если передан scope_sql (запрос, возвращающий строки orders), связанные
+        записи выбираются подзапросом; иначе — списками IN по идентификаторам.
+        """
+        if not order_rows:
+            return []
+
+        clients = {}
+        products = {}
+        items = {}  # (product_id, quantity, unit_price) -> OrderItem
+        lines = {}
+
+        def add_client_rows(rows):
+            for row in rows:
+                clients[row["client_id"]] = Client(row["client_id"], row["name"], row["email"], row["phone"])
+
+        def add_line_rows(rows):
+            for row in rows:
+                pid = row["product_id"]
+                key = (pid, row["quantity"], row["unit_price"])
+                item = items.get(key)
+                if item is None:
+                    product = products.get(pid)
+                    if product is None:
+                        product = self._make_product(pid, row["name"], row["price"])
+                        products[pid] = product
+                    item = OrderItem(product, row["quantity"], row["unit_price"])
+                    items[key] = item
+                lines.setdefault(row["order_id"], []).append(item)
+
+        if scope_sql is not None:
+            cursor.execute(f"SELECT * FROM clients WHERE client_id IN "
+                           f"(SELECT client_id FROM ({scope_sql}))", scope_params)
+            add_client_rows(cursor.fetchall())
+            cursor.execute(f"SELECT op.order_id, p.product_id, p.name, p.price, op.quantity, op.unit_price FROM products p "
+                           f"JOIN order_products op ON p.product_id = op.product_id "
+                           f"WHERE op.order_id IN (SELECT order_id FROM ({scope_sql}))", scope_params)
+            add_line_rows(cursor.fetchall())
+        else:
+            client_ids = list({row["client_id"] for row in order_rows})
+            order_ids = [row["order_id"] for row in order_rows]
+            for chunk in _chunks(client_ids, SQL_CHUNK_SIZE):
+                placeholders = ", ".join("?" * len(chunk))
+                cursor.execute(f"SELECT * FROM clients WHERE client_id IN ({placeholders})", chunk)
+                add_client_rows(cursor.fetchall())
+            for chunk in _chunks(order_ids, SQL_CHUNK_SIZE):
+                placeholders = ", ".join("?" * len(chunk))
+                cursor.execute(f"SELECT op.order_id, p.product_id, p.name, p.price, op.quantity, op.unit_price FROM products p "
+                               f"JOIN order_products op ON p.product_id = op.product_id "
+                               f"WHERE op.order_id IN ({placeholders})", chunk)
+                add_line_rows(cursor.fetchall())
+
+        orders = []
+        for row in order_rows:
+            oid = row["order_id"]
+            date = datetime.fromisoformat(row["date"])
+            orders.append(Order(oid, clients.get(row["client_id"]), lines.get(oid, []), date, row["status"]))
+        return orders
+
+    def iter_order_lines(self, chunk_size: int = ORDER_LINES_CHUNK_SIZE, ordered: bool = False):
+        """Выдаёт позиции заказов порциями (списки кортежей в порядке ORDER_LINE_COLUMNS).
+
+        ordered=True выдаёт позиции по возрастанию order_id (по первичному ключу
+        order_products, без сортировки): позиции одного заказа идут подряд.
+        """
+        try:
+            cursor = self._reader().cursor()
+            cursor.row_factory = None
+            query = _order_lines_sql(self.get_schema_version())
+            cursor.execute(query + (" ORDER BY op.order_id" if ordered else ""))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        except sqlite3.Error as e:
+            print(f"Ошибка получения позиций заказов: {e}")
+
+    def count_orders(self) -> int:
+        """Возвращает число заказов."""
+        return self._count("orders")
+
     def delete_order(self, order_id: int) -> bool:
         """Удаляет заказ и связанные товары."""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("DELETE FROM order_products WHERE order_id = ?", (order_id,))
-            cursor.execute("DELETE FROM orders WHERE order_id = ?", (order_id,))
-            self.conn.commit()
+            with self._writer() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM order_products WHERE order_id = ?", (order_id,))
+                cursor.execute("DELETE FROM orders WHERE order_id = ?", (order_id,))
+                deleted = cursor.rowcount
+            if deleted > 0:
+                self._notify("order", "delete", [order_id])
             return True
         except sqlite3.Error as e:
             print(f"Ошибка при удалении заказа: {e}")
@@ -263,68 +1548,445 @@ class Database:
 
     def get_all_orders_sorted(self, sort_by: str = "date", descending: bool = True) -> List[Order]:
         """Получить все заказы, отсортированные по дате или стоимости"""
+        orders, _ = self.get_orders_page(sort_by=sort_by, descending=descending, limit=None)
+        return orders
+
+    def get_orders_page(self, sort_by: str = "date", descending: bool = True,
+                        limit: Optional[int] = 100, offset: int = 0,
+                        after: Optional[Tuple] = None, min_total: Optional[float] = None,
+                        max_total: Optional[float] = None,
+                        search: Optional[str] = None) -> Tuple[List[Order], Optional[Tuple]]:
+        """Получает одну страницу заказов, отсортированных средствами SQL.
+
+        sort_by — "date" или "total" (столбец orders.total; сортировка, топ N
+        и фильтр min_total/max_total по сумме идут по индексу idx_orders_total).
+        search — строка поиска по имени, email, телефону клиента и названиям товаров.
+        after — курсор (значение ключа сортировки, order_id) последней строки
+        предыдущей страницы; если он задан, offset обычно не нужен.
+        Возвращает список заказов и курсор для следующей страницы
+        (None, если страница последняя).
+        """
+        query = OrderQuery(sort_by, descending).total_range(min_total, max_total)
+        if search is not None:
+            query.search(search)
+        return self.find_orders(query, limit, offset, after)
+
+    def find_orders(self, query: OrderQuery, limit: Optional[int] = 100, offset: int = 0,
+                    after: Optional[Tuple] = None) -> Tuple[List[Order], Optional[Tuple]]:
+        """Получает страницу заказов, подходящих под OrderQuery, в его сортировке.
+
+        limit=None — все заказы. after — курсор последней строки предыдущей страницы.
+        Возвращает список заказов и курсор для следующей страницы (None, если страница последняя).
+        """
+        if query.impossible:
+            return [], None
+        key = ORDER_SORT_FIELDS[query.sort_by]
+        where, params = query.where_sql(after)
+        sql = ORDERS_WITH_TOTAL_SQL.strip() + where + query.order_sql() + " LIMIT ? OFFSET ?"
+        params.extend([-1 if limit is None else limit, offset])
+
         orders = []
-        valid_sort_fields = {"date", "total"}
-        if sort_by not in valid_sort_fields:
-            sort_by = "date"
+        next_cursor = None
+        try:
+            cursor = self._reader().cursor()
+            cursor.execute(sql, params)
+            order_rows = cursor.fetchall()
+            if limit is None:
+                orders = self._hydrate_orders(cursor, order_rows, scope_sql=sql, scope_params=tuple(params))
+            else:
+                orders = self._hydrate_orders(cursor, order_rows)
+            if limit is not None and len(order_rows) == limit:
+                last = order_rows[-1]
+                next_cursor = (last[key], last["order_id"])
+        except sqlite3.Error as e:
+            print(f"Ошибка получения заказов: {e}")
+        return orders, next_cursor
+
+    def iter_orders(self, query: OrderQuery, batch_size: int = 1000):
+        """Выдаёт заказы, подходящие под OrderQuery, списками по batch_size (чтение по курсору страниц)."""
+        after = None
+        while True:
+            orders, after = self.find_orders(query, limit=batch_size, after=after)
+            if orders:
+                yield orders
+            if after is None:
+                break
 
+    def count_matching_orders(self, query: OrderQuery) -> int:
+        """Возвращает число заказов, подходящих под OrderQuery."""
+        if query.impossible:
+            return 0
+        where, params = query.where_sql()
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT order_id FROM orders")
-            order_ids = [row["order_id"] for row in cursor.fetchall()]
-            orders_unsorted = []
-            for oid in order_ids:
-                order = self.get_order(oid)
-                if order:
-                    orders_unsorted.append(order)
+            return self._reader().execute(f"SELECT COUNT(*) FROM orders{where}", params).fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Ошибка подсчёта заказов: {e}")
+            return 0
 
-            if sort_by == "date":
-                orders = sorted(orders_unsorted, key=lambda o: o.date, reverse=descending)
-            elif sort_by == "total":
-                orders = sorted(orders_unsorted, key=lambda o: o.total_price(), reverse=descending)
+    def get_column_range(self, table: str, column: str) -> Tuple:
+        """Возвращает (наименьшее, наибольшее) значение столбца; (None, None) для пустой таблицы."""
+        try:
+            row = self._reader().execute(f"SELECT MIN({column}), MAX({column}) FROM {table}").fetchone()
+            return row[0], row[1]
+        except sqlite3.Error as e:
+            print(f"Ошибка получения диапазона {table}.{column}: {e}")
+            return None, None
 
+    def get_order_statuses(self) -> List[str]:
+        """Возвращает список статусов, которые встречаются в заказах."""
+        try:
+            return [row[0] for row in self._reader().execute("SELECT DISTINCT status FROM orders ORDER BY status")]
         except sqlite3.Error as e:
-            print(f"Ошибка получения заказов: {e}")
+            print(f"Ошибка получения статусов заказов: {e}")
+            return []
 
-        return orders
+    def search_clients(self, text: str, limit: int = 100, offset: int = 0) -> List[Client]:
+        """Ищет клиентов по имени, email и телефону (каждое слово — начало слова в данных).
+
+        Результаты упорядочены по релевантности (bm25), совпадения в имени важнее.
+        """
+        match = _fts_query(text)
+        clients = []
+        if match is None:
+            return clients
+        try:
+            cursor = self._reader().cursor()
+            cursor.execute(f"""
+                SELECT c.client_id, c.name, c.email, c.phone FROM clients_fts
+                JOIN clients c ON c.client_id = clients_fts.rowid
+                WHERE clients_fts MATCH ? ORDER BY {CLIENT_SEARCH_RANK}, c.client_id LIMIT ? OFFSET ?
+            """, (match, limit, offset))
+            for row in cursor.fetchall():
+                clients.append(Client(row["client_id"], row["name"], row["email"], row["phone"]))
+        except sqlite3.Error as e:
+            print(f"Ошибка поиска клиентов: {e}")
+        return clients
+
+    def count_search_clients(self, text: str) -> int:
+        """Возвращает число клиентов, найденных search_clients."""
+        return self._count_matches("clients_fts", text)
+
+    def search_products(self, text: str, limit: int = 100, offset: int = 0) -> List[Product]:
+        """Ищет товары по названию (каждое слово — начало слова), по релевантности (bm25)."""
+        match = _fts_query(text)
+        products = []
+        if match is None:
+            return products
+        try:
+            cursor = self._reader().cursor()
+            cursor.execute("""
+                SELECT p.product_id, p.name, p.price FROM products_fts
+                JOIN products p ON p.product_id = products_fts.rowid
+                WHERE products_fts MATCH ? ORDER BY bm25(products_fts), p.product_id LIMIT ? OFFSET ?
+            """, (match, limit, offset))
+            for row in cursor.fetchall():
+                products.append(Product(row["product_id"], row["name"], row["price"]))
+        except sqlite3.Error as e:
+            print(f"Ошибка поиска товаров: {e}")
+        return products
+
+    def count_search_products(self, text: str) -> int:
+        """Возвращает число товаров, найденных search_products."""
+        return self._count_matches("products_fts", text)
+
+    def count_search_orders(self, text: str) -> int:
+        """Возвращает число заказов, найденных get_orders_page(search=text)."""
+        return self.count_matching_orders(OrderQuery().search(text))
+
+    def _count_matches(self, fts_table: str, text: str) -> int:
+        """Возвращает число строк индекса fts_table, подходящих под строку поиска."""
+        match = _fts_query(text)
+        if match is None:
+            return 0
+        try:
+            row = self._reader().execute(f"SELECT COUNT(*) FROM {fts_table} WHERE {fts_table} MATCH ?",
+                                         (match,)).fetchone()
+            return row[0]
+        except sqlite3.Error as e:
+            print(f"Ошибка поиска в {fts_table}: {e}")
+            return 0
+
+    def export_clients_to_csv(self, filepath: str, compress: Optional[bool] = None,
+                              chunk_size: int = EXPORT_CHUNK_SIZE) -> int:
+        """Экспортирует клиентов в CSV файл, читая таблицу порциями. Возвращает число строк."""
+        return self._export_query_to_csv("SELECT client_id, name, email, phone FROM clients ORDER BY client_id",
+                                         filepath, compress, chunk_size)
+
+    def export_orders_to_csv(self, filepath: str, compress: Optional[bool] = None,
+                             chunk_size: int = EXPORT_CHUNK_SIZE) -> int:
+        """Экспортирует заказы (с суммой) в CSV файл, читая таблицу порциями. Возвращает число строк."""
+        return self._export_query_to_csv(f"SELECT * FROM ({ORDERS_WITH_TOTAL_SQL}) ORDER BY order_id",
+                                         filepath, compress, chunk_size)
+
+    def export_order_lines_to_csv(self, filepath: str, compress: Optional[bool] = None,
+                                  chunk_size: int = EXPORT_CHUNK_SIZE) -> int:
+        """Экспортирует позиции заказов в CSV файл, читая таблицу порциями. Возвращает число строк."""
+        return self._export_query_to_csv("SELECT order_id, product_id, quantity, unit_price FROM order_products "
+                                         "ORDER BY order_id, product_id",
+                                         filepath, compress, chunk_size)
 
-    def export_clients_to_csv(self, filepath: str) -> None:
-        """Экспортирует клиентов в CSV файл."""
-        clients = self.get_all_clients()
-        with open(filepath, mode='w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(["client_id", "name", "email", "phone"])
-            for c in clients:
-                writer.writerow([c.client_id, c.name, c.email, c.phone])
-
-    def import_clients_from_csv(self, filepath: str) -> None:
-        """Импортирует клиентов из CSV файла."""
+    def _export_query_to_csv(self, query: str, filepath: str, compress: Optional[bool],
+                             chunk_size: int) -> int:
+        """Пишет результат запроса в CSV по мере чтения курсора; заголовок — имена столбцов."""
+        count = 0
+        try:
+            cursor = self._reader().cursor()
+            cursor.execute(query)
+            with _open_text(filepath, 'w', compress) as f:
+                writer = csv.writer(f)
+                writer.writerow([column[0] for column in cursor.description])
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    writer.writerows(tuple(row) for row in rows)
+                    count += len(rows)
+        except sqlite3.Error as e:
+            print(f"Ошибка экспорта в {filepath}: {e}")
+        return count
+
+    def import_clients_from_csv(self, filepath: str, batch_size: int = IMPORT_BATCH_SIZE,
+                                on_conflict: str = "skip", validate: bool = True) -> Optional[ImportReport]:
+        """Импортирует клиентов из CSV файла потоково, пакетами по batch_size строк.
+
+        Строки с неверными email или телефоном отклоняются (validate=True);
+        их коды ошибок попадают в report.error_codes.
+        """
         if not os.path.exists(filepath):
             print(f"Файл {filepath} не найден.")
-            return
-        with open(filepath, mode='r', newline='', encoding='utf-8') as f:
+            return None
+        with _open_text(filepath, 'r') as f:
             reader = csv.DictReader(f)
-            for row in reader:
-                client = Client(int(row["client_id"]), row["name"], row["email"], row["phone"])
-                self.add_client(client)
-
-    def export_products_to_json(self, filepath: str) -> None:
-        """Экспортирует товары в JSON файл."""
-        products = self.get_all_products()
-        products_data = [{"product_id": p.product_id, "name": p.name, "price": p.price} for p in products]
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(products_data, f, ensure_ascii=False, indent=4)
-
-    def import_products_from_json(self, filepath: str) -> None:
-        """Импортирует товары из JSON файла."""
+            records = (_parse_client_record(reader.line_num, row, validate) for row in reader)
+            return self._bulk_insert("clients", "client_id", CLIENT_COLUMNS, records, batch_size, on_conflict)
+
+    def bulk_import_clients(self, rows: Iterable[dict], batch_size: int = IMPORT_BATCH_SIZE,
+                            on_conflict: str = "skip", validate: bool = True) -> ImportReport:
+        """Массово добавляет клиентов из словарей с ключами client_id, name, email, phone."""
+        records = (_parse_client_record(i, row, validate) for i, row in enumerate(rows, start=1))
+        return self._bulk_insert("clients", "client_id", CLIENT_COLUMNS, records, batch_size, on_conflict)
+
+    def export_products_to_json(self, filepath: str, compress: Optional[bool] = None,
+                                chunk_size: int = EXPORT_CHUNK_SIZE) -> int:
+        """Экспортирует товары в JSON файл, записывая элементы массива по мере чтения курсора.
+
+        Формат файла совпадает с json.dump(..., indent=4). Возвращает число товаров.
+        """
+        count = 0
+        try:
+            cursor = self._reader().cursor()
+            cursor.execute("SELECT product_id, name, price FROM products ORDER BY product_id")
+            with _open_text(filepath, 'w', compress) as f:
+                f.write("[")
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    parts = []
+                    for row in rows:
+                        item = {"product_id": row["product_id"], "name": row["name"], "price": row["price"]}
+                        text = json.dumps(item, ensure_ascii=False, indent=4).replace("\n", "\n    ")
+                        parts.append(("\n    " if count == 0 else ",\n    ") + text)
+                        count += 1
+                    f.write("".join(parts))
+                f.write("\n]" if count else "]")
+        except sqlite3.Error as e:
+            print(f"Ошибка экспорта в {filepath}: {e}")
+        return count
+
+    def import_products_from_json(self, filepath: str, batch_size: int = IMPORT_BATCH_SIZE,
+                                  on_conflict: str = "skip") -> Optional[ImportReport]:
+        """Импортирует товары из JSON файла (массива объектов), не загружая файл в память целиком."""
         if not os.path.exists(filepath):
             print(f"Файл {filepath} не найден.")
-            return
-        with open(filepath, 'r', encoding='utf-8') as f:
-            products_data = json.load(f)
-            for item in products_data:
-                product = Product(item["product_id"], item["name"], item["price"])
-                self.add_product(product)
+            return None
+        with _open_text(filepath, 'r') as f:
+            try:
+                return self.bulk_import_products(_iter_json_array(f), batch_size, on_conflict)
+            except ValueError as e:
+                print(f"Ошибка чтения JSON файла {filepath}: {e}")
+                return None
+
+    def bulk_import_products(self, items: Iterable[dict], batch_size: int = IMPORT_BATCH_SIZE,
+                             on_conflict: str = "skip") -> ImportReport:
+        """Массово добавляет товары из словарей с ключами product_id, name, price."""
+        records = (_parse_product_record(i, item) for i, item in enumerate(items, start=1))
+        return self._bulk_insert("products", "product_id", PRODUCT_COLUMNS, records, batch_size, on_conflict)
+
+    def _bulk_insert(self, table: str, key: str, columns: Tuple[str, ...], records,
+                     batch_size: int, on_conflict: str) -> ImportReport:
+        """Вставляет записи через executemany, по одной транзакции на пакет.
+
+        records — итерируемое из (номер записи, кортеж значений или None, причина ошибки).
+        on_conflict определяет поведение при существующем ключе:
+        "skip" — пропустить запись, "upsert" — обновить её, "fail" — откатить
+        текущий пакет и остановить импорт (ранее зафиксированные пакеты остаются).
+        """
+        report = ImportReport()
+        if on_conflict not in IMPORT_CONFLICT_POLICIES:
+            report.fail(f"Неизвестная политика конфликтов: {on_conflict}")
+            return report
+
+        column_list = ", ".join(columns)
+        placeholders = ", ".join("?" * len(columns))
+        if on_conflict == "skip":
+            query = f"INSERT OR IGNORE INTO {table} ({column_list}) VALUES ({placeholders})"
+        elif on_conflict == "upsert":
+            updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != key)
+            query = (f"INSERT INTO {table} ({column_list}) VALUES ({placeholders}) "
+                     f"ON CONFLICT({key}) DO UPDATE SET {updates}")
+        else:
+            query = f"INSERT INTO {table} ({column_list}) VALUES ({placeholders})"
+
+        batch = []
+        for position, values, error, code in records:
+            if values is None:
+                report.add_invalid(position, error, code)
+                continue
+            batch.append(values)
+            if len(batch) >= batch_size:
+                if not self._insert_batch(table, key, query, batch, on_conflict, report):
+                    return report
+                batch = []
+        if batch:
+            self._insert_batch(table, key, query, batch, on_conflict, report)
+        return report
+
+    def _insert_batch(self, table: str, key: str, query: str, batch: list,
+                      on_conflict: str, report: ImportReport) -> bool:
+        """Записывает один пакет в отдельной транзакции и обновляет отчёт.
+
+        Построчные триггеры FTS5 на время пакета снимаются: индекс обновляется
+        одним запросом по ключам пакета, а триггеры создаются заново в той же транзакции.
+        """
+        fts = FTS_INDEXES.get(table) if self._fts else None
+        try:
+            with self._writer() as conn:
+                cursor = conn.cursor()
+                if fts:
+                    cursor.execute("BEGIN")  # DDL не открывает транзакцию сам
+                keys = [values[0] for values in batch]
+                found = set()
+                if on_conflict == "upsert" or fts:
+                    for chunk in _chunks(list(set(keys)), SQL_CHUNK_SIZE):
+                        placeholders = ", ".join("?" * len(chunk))
+                        cursor.execute(f"SELECT {key} FROM {table} WHERE {key} IN ({placeholders})", chunk)
+                        found.update(row[0] for row in cursor.fetchall())
+                existing = 0
+                if on_conflict == "upsert":
+                    seen = set()
+                    for k in keys:
+                        if k in found or k in seen:
+                            existing += 1
+                        seen.add(k)
+                if fts:
+                    fts_table = fts[0]
+                    for event in ("insert", "delete", "update"):
+                        cursor.execute(f"DROP TRIGGER IF EXISTS trg_{fts_table}_{event}")
+                    if on_conflict == "upsert":
+                        self._sync_fts(cursor, table, found, delete=True)
+                cursor.executemany(query, batch)
+                inserted = cursor.rowcount
+                if fts:
+                    # Пропущенные дубликаты остались прежними — в индексе они уже есть
+                    changed = set(keys) if on_conflict == "upsert" else set(keys) - found
+                    self._sync_fts(cursor, table, changed)
+                    for statement in _fts_triggers(table):
+                        cursor.execute(statement)
+        except sqlite3.IntegrityError as e:
+            report.fail(f"Конфликт ключей, пакет из {len(batch)} записей отменён: {e}")
+            return False
+        except sqlite3.Error as e:
+            report.fail(f"Ошибка записи пакета: {e}")
+            return False
+
+        self._notify(TABLE_ENTITIES[table], "import", [values[0] for values in batch])
+        if on_conflict == "skip":
+            report.inserted += inserted
+            report.duplicates += len(batch) - inserted
+        elif on_conflict == "upsert":
+            report.inserted += len(batch) - existing
+            report.updated += existing
+        else:
+            report.inserted += len(batch)
+        return True
+
+    @staticmethod
+    def _sync_fts(cursor: sqlite3.Cursor, table: str, keys, delete: bool = False):
+        """Добавляет строки с данными ключами в индекс FTS5 (или удаляет их прежние значения)."""
+        fts_table, key, columns = FTS_INDEXES[table]
+        names = ", ".join(columns)
+        if delete:
+            target, select = f"{fts_table} ({fts_table}, rowid, {names})", f"'delete', {key}, {names}"
+        else:
+            target, select = f"{fts_table} (rowid, {names})", f"{key}, {names}"
+        for chunk in _chunks(list(keys), SQL_CHUNK_SIZE):
+            placeholders = ", ".join("?" * len(chunk))
+            cursor.execute(f"INSERT INTO {target} SELECT {select} FROM {table} "
+                           f"WHERE {key} IN ({placeholders})", chunk)
+
+
+def _measure_query(db: Database, query: str, params: tuple, repeat: int) -> Tuple[List[str], float]:
+    """Возвращает план запроса и лучшее время его выполнения в секундах (изменения откатываются)."""
+    plan = db.explain(query, params)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db.conn.execute(query, params).fetchall()
+        best = min(best, time.perf_counter() - start)
+        db.conn.rollback()
+    return plan, best
+
+
+def benchmark_migration(version: int, db_name: str = DB_NAME, repeat: int = 5) -> List[dict]:
+    """Сравнивает планы и время запросов миграции до и после её применения.
+
+    Данные из db_name копируются в базу в памяти со схемой версии version - 1,
+    сам файл базы не изменяется.
+    """
+    migration = next(m for m in MIGRATIONS if m["version"] == version)
+    bench = Database(":memory:", schema_version=version - 1)
+    bench.conn.execute("ATTACH DATABASE ? AS src", (db_name,))
+    for table in DATA_TABLES:
+        target_columns = {row["name"] for row in bench.conn.execute(f"PRAGMA main.table_info({table})")}
+        source_columns = [row["name"] for row in bench.conn.execute(f"PRAGMA src.table_info({table})")]
+        columns = ", ".join(c for c in source_columns if c in target_columns)
+        if columns:
+            bench.conn.execute(f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM src.{table}")
+    bench.conn.commit()
+    bench.conn.execute("DETACH DATABASE src")
+
+    benchmarks = [entry if len(entry) == 4 else entry + entry for entry in migration["benchmarks"]]
+    before = [_measure_query(bench, query, params, repeat) for _, _, query, params in benchmarks]
+    bench.migrate(version)
+    after = [_measure_query(bench, query, params, repeat) for query, params, _, _ in benchmarks]
+    bench.close()
+
+    results = []
+    for (query, _, query_before, _), (plan_before, time_before), (plan_after, time_after) in zip(
+            benchmarks, before, after):
+        results.append({
+            "query": query,
+            "query_before": query_before,
+            "plan_before": plan_before,
+            "plan_after": plan_after,
+            "time_before": time_before,
+            "time_after": time_after,
+        })
+    return results
+
 
+def print_migration_benchmarks(db_name: str = DB_NAME) -> None:
+    """Печатает результаты benchmark_migration для всех миграций."""
+    for migration in MIGRATIONS:
+        print(f"Миграция {migration['version']}: {migration['description']}")
+        for result in benchmark_migration(migration["version"], db_name):
+            print(f"  {result['query']}")
+            if result["query_before"] != result["query"]:
+                print(f"    (до миграции: {' '.join(result['query_before'].split())})")
+            print(f"    до:    {result['time_before'] * 1000:.3f} мс; {' | '.join(result['plan_before'])}")
+            print(f"    после: {result['time_after'] * 1000:.3f} мс; {' | '.join(result['plan_after'])}")
 
 
+if __name__ == "__main__":
+    print_migration_benchmarks(sys.argv[1] if len(sys.argv) > 1 else DB_NAME)
@@ -7,28 +7,64 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import os
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
-from models import Client, Product, Order
-from db import Database
+from models import Client, Product, Order, CONTACT_OK, contact_error_code, describe_contact_errors
+from db import Database, OrderQuery, ENTITY_CACHE_SIZE
+from collections import OrderedDict
 from datetime import datetime
-from typing import List
+from typing import List, Optional, Tuple
 
 import matplotlib.pyplot as plt
 import seaborn as sns
 import networkx as nx
-from analysis import plot_top_clients_by_orders, plot_orders_dynamics, build_clients_graph, plot_clients_graph
+from analysis import (top_clients_by_orders, draw_top_clients, orders_per_date,
+                      draw_orders_dynamics, clients_graph_view_from_db, draw_graph_view)
+from tasks import TaskRunner
+from widgets import VirtualTreeview
+
+GRAPH_LAYOUT_SUFFIX = ".graph_layout.json"  # файл расположения узлов графа клиентов рядом с базой
+SEARCH_DELAY_MS = 300  # пауза после ввода в строке поиска перед запросом к базе
+DATE_FORMATS = ("%d-%m-%Y", "%Y-%m-%d")
+ORDER_CURSOR_ANCHORS = 64  # запомненных курсоров страниц таблицы заказов
+
+
+def parse_date(text: str):
+    """Разбирает дату в формате ДД-ММ-ГГГГ или ГГГГ-ММ-ДД; возвращает datetime или None."""
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
 
 class App(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("Система учёта заказов")
         self.geometry("900x700")
-        self.db = Database()
+        self.db = Database(pooled=True, entity_cache_size=ENTITY_CACHE_SIZE)
+        self.runner = TaskRunner(self)
+        self.runner.on_progress = self.show_progress
+        self.runner.on_tasks_changed = self.update_task_status
+        # Строки поиска читаются в рабочих потоках, поэтому хранятся вне виджетов
+        self.client_search = ""
+        self.product_search = ""
+        self.order_search = ""
+        self.order_filters = {}
+        # (состояние запроса, позиция строки) -> курсор (ключ сортировки, order_id) строки перед ней
+        self.order_anchors = OrderedDict()
+        self.order_anchors_lock = threading.Lock()
         self.create_widgets()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.db.subscribe(lambda *change: self.runner.call_soon(self.on_data_changed, *change))
 
     def create_widgets(self):
         """ Создаёт вкладки интерфейса: Клиенты, Товары, Заказы и Аналитика."""
+        self.create_status_bar()
         tab_control = ttk.Notebook(self)
         self.client_tab = ttk.Frame(tab_control)
         self.product_tab = ttk.Frame(tab_control)
@@ -46,7 +82,98 @@ class App(tk.Tk):
         self.create_order_tab()
         self.create_analysis_tab()
 
-   
+    def create_status_bar(self):
+        """Создаёт строку состояния с индикатором фоновых задач и кнопкой отмены."""
+        status_frame = ttk.Frame(self)
+        status_frame.pack(side="bottom", fill="x", padx=10, pady=(0, 5))
+        self.status_label = ttk.Label(status_frame, text="Готово")
+        self.status_label.pack(side="left")
+        self.cancel_btn = ttk.Button(status_frame, text="Отмена", command=self.runner.cancel_all, state="disabled")
+        self.cancel_btn.pack(side="right")
+        self.progress_bar = ttk.Progressbar(status_frame, mode="determinate", length=200)
+        self.progress_bar.pack(side="right", padx=5)
+
+    def show_progress(self, task, fraction, message):
+        """Отображает прогресс фоновой задачи."""
+        if fraction is None:
+            if str(self.progress_bar["mode"]) != "indeterminate":
+                self.progress_bar.configure(mode="indeterminate")
+                self.progress_bar.start(10)
+        else:
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode="determinate", value=fraction * 100)
+        self.status_label.configure(text=message or task.name)
+
+    def update_task_status(self, tasks):
+        """Обновляет строку состояния при запуске и завершении фоновых задач."""
+        if tasks:
+            self.status_label.configure(text=tasks[-1].name)
+            self.cancel_btn.configure(state="normal")
+            self.progress_bar.configure(mode="indeterminate")
+            self.progress_bar.start(10)
+        else:
+            self.status_label.configure(text="Готово")
+            self.cancel_btn.configure(state="disabled")
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode="determinate", value=0)
+
+    def on_data_changed(self, entity: str, action: str, ids: list):
+        """Обновляет только затронутые строки таблиц после изменения данных в базе."""
+        lists = {"client": self.client_list, "product": self.product_list, "order": self.order_list}
+        view = lists[entity]
+        searches = {"client": self.client_search, "product": self.product_search,
+                    "order": self.order_search or self.order_filters}
+        iids = [str(i) for i in ids]
+        if searches[entity] and action in ("add", "delete"):
+            view.refresh()  # при поиске и фильтрах неизвестно, входят ли строки в результаты
+        elif action == "add":
+            view.rows_added(len(iids))
+        elif action == "delete":
+            view.rows_deleted(iids)
+        elif action == "update":
+            view.rows_changed(iids)
+        else:
+            view.refresh()
+            if entity != "order":
+                self.order_list.refresh()  # в заказах показаны имена клиентов и товаров
+
+    def create_search_box(self, parent, on_search):
+        """Создаёт строку поиска; on_search(text) вызывается после паузы в наборе текста."""
+        search_frame = ttk.Frame(parent)
+        search_frame.pack(fill="x", padx=5, pady=(5, 0))
+        ttk.Label(search_frame, text="Поиск:").pack(side="left")
+        entry = ttk.Entry(search_frame)
+        entry.pack(side="left", fill="x", expand=True, padx=5)
+        pending = []
+
+        def run_search():
+            pending.clear()
+            on_search(entry.get().strip())
+
+        def schedule(event=None):
+            if pending:
+                self.after_cancel(pending.pop())
+            pending.append(self.after(SEARCH_DELAY_MS, run_search))
+
+        def clear():
+            entry.delete(0, tk.END)
+            schedule()
+
+        entry.bind("<KeyRelease>", schedule)
+        entry.bind("<Return>", lambda event: run_search())
+        ttk.Button(search_frame, text="Сбросить", command=clear).pack(side="left")
+        return entry
+
+    def show_task_error(self, error: Exception):
+        """Сообщает об ошибке фоновой задачи."""
+        messagebox.showerror("Ошибка", f"Не удалось выполнить операцию: {error}")
+
+    def on_close(self):
+        """Останавливает фоновые задачи и закрывает базу данных перед выходом."""
+        self.runner.shutdown()
+        self.db.close()
+        self.destroy()
+
     def create_client_tab(self):
         """Создаёт вкладку для управления клиентами: добавление, просмотр, удаление."""
         frame = self.client_tab
@@ -76,12 +203,17 @@ class App(tk.Tk):
         list_frame = ttk.LabelFrame(frame, text="Список клиентов")
         list_frame.pack(fill="both", expand=True, padx=10, pady=10)
 
+        self.create_search_box(list_frame, self.search_clients)
+
         columns = ("ID", "Имя", "Email", "Телефон")
-        self.client_tree = ttk.Treeview(list_frame, columns=columns, show="headings")
+        self.client_list = VirtualTreeview(list_frame, columns, self.fetch_client_rows, self.count_client_rows,
+                                           runner=self.runner, name="Загрузка клиентов",
+                                           on_error=self.show_task_error)
+        self.client_tree = self.client_list.tree
         for col in columns:
             self.client_tree.heading(col, text=col)
             self.client_tree.column(col, width=150)
-        self.client_tree.pack(fill="both", expand=True)
+        self.client_list.pack(fill="both", expand=True)
 
         refresh_btn = ttk.Button(list_frame, text="Обновить список", command=self.load_clients)
         refresh_btn.pack(pady=5)
@@ -99,12 +231,12 @@ class App(tk.Tk):
             email = self.client_email_entry.get().strip()
             phone = self.client_phone_entry.get().strip()
             client = Client(client_id, name, email, phone)
-            if not client.is_valid():
-                messagebox.showerror("Ошибка", "Неверный email или телефон.")
+            code = contact_error_code(name, email, phone)
+            if code != CONTACT_OK:
+                messagebox.showerror("Ошибка", f"Неверные данные клиента: {describe_contact_errors(code)}.")
                 return
             if self.db.add_client(client):
                 messagebox.showinfo("Успех", "Клиент добавлен.")
-                self.load_clients()
                 self.clear_client_form()
             else:
                 messagebox.showerror("Ошибка", "Не удалось добавить клиента. Возможно, ID уже существует.")
@@ -112,12 +244,27 @@ class App(tk.Tk):
             messagebox.showerror("Ошибка", "ID клиента должен быть числом.")
 
     def load_clients(self):
-        """Загружает список клиентов из базы данных и отображает в таблице."""
-        for row in self.client_tree.get_children():
-            self.client_tree.delete(row)
-        clients = self.db.get_all_clients()
-        for c in clients:
-            self.client_tree.insert("", "end", values=(c.client_id, c.name, c.email, c.phone))
+        """Обновляет видимую часть списка клиентов."""
+        self.client_list.refresh()
+
+    def search_clients(self, text: str):
+        """Показывает клиентов, найденных по имени, email или телефону (пустая строка — всех)."""
+        self.client_search = text
+        self.client_list.reset()
+
+    def fetch_client_rows(self, offset: int, limit: int):
+        """Возвращает строки таблицы клиентов начиная с позиции offset."""
+        if self.client_search:
+            clients = self.db.search_clients(self.client_search, limit, offset)
+        else:
+            clients = self.db.get_clients_page(limit, offset)
+        return [(str(c.client_id), (c.client_id, c.name, c.email, c.phone)) for c in clients]
+
+    def count_client_rows(self) -> int:
+        """Возвращает число строк в таблице клиентов с учётом поиска."""
+        if self.client_search:
+            return self.db.count_search_clients(self.client_search)
+        return self.db.count_clients()
 
     def clear_client_form(self):
         self.client_id_entry.delete(0, tk.END)
@@ -135,8 +282,6 @@ class App(tk.Tk):
         if messagebox.askyesno("Подтверждение", f"Удалить клиента с ID {client_id}?"):
             if self.db.delete_client(client_id):
                 messagebox.showinfo("Успех", "Клиент удалён.")
-                self.load_clients()
-                self.load_orders()  # Обновить заказы, т.к. могли удалиться связанные
             else:
                 messagebox.showerror("Ошибка", "Не удалось удалить клиента.")
 
@@ -165,12 +310,17 @@ class App(tk.Tk):
         list_frame = ttk.LabelFrame(frame, text="Список товаров")
         list_frame.pack(fill="both", expand=True, padx=10, pady=10)
 
+        self.create_search_box(list_frame, self.search_products)
+
         columns = ("ID", "Название", "Цена")
-        self.product_tree = ttk.Treeview(list_frame, columns=columns, show="headings")
+        self.product_list = VirtualTreeview(list_frame, columns, self.fetch_product_rows, self.count_product_rows,
+                                            runner=self.runner, name="Загрузка товаров",
+                                            on_error=self.show_task_error)
+        self.product_tree = self.product_list.tree
         for col in columns:
             self.product_tree.heading(col, text=col)
             self.product_tree.column(col, width=150)
-        self.product_tree.pack(fill="both", expand=True)
+        self.product_list.pack(fill="both", expand=True)
 
         refresh_btn = ttk.Button(list_frame, text="Обновить список", command=self.load_products)
         refresh_btn.pack(pady=5)
@@ -192,7 +342,6 @@ class App(tk.Tk):
             product = Product(product_id, name, price)
             if self.db.add_product(product):
                 messagebox.showinfo("Успех", "Товар добавлен.")
-                self.load_products()
                 self.clear_product_form()
             else:
                 messagebox.showerror("Ошибка", "Не удалось добавить товар. Возможно, ID уже существует.")
@@ -200,12 +349,27 @@ class App(tk.Tk):
             messagebox.showerror("Ошибка", "ID должен быть числом, цена - числом с точкой.")
 
     def load_products(self):
-        """Отображает список товаров в таблице."""
-        for row in self.product_tree.get_children():
-            self.product_tree.delete(row)
-        products = self.db.get_all_products()
-        for p in products:
-            self.product_tree.insert("", "end", values=(p.product_id, p.name, f"{p.price:.2f}"))
+        """Обновляет видимую часть списка товаров."""
+        self.product_list.refresh()
+
+    def search_products(self, text: str):
+        """Показывает товары, найденные по названию (пустая строка — все)."""
+        self.product_search = text
+        self.product_list.reset()
+
+    def fetch_product_rows(self, offset: int, limit: int):
+        """Возвращает строки таблицы товаров начиная с позиции offset."""
+        if self.product_search:
+            products = self.db.search_products(self.product_search, limit, offset)
+        else:
+            products = self.db.get_products_page(limit, offset)
+        return [(str(p.product_id), (p.product_id, p.name, f"{p.price:.2f}")) for p in products]
+
+    def count_product_rows(self) -> int:
+        """Возвращает число строк в таблице товаров с учётом поиска."""
+        if self.product_search:
+            return self.db.count_search_products(self.product_search)
+        return self.db.count_products()
 
     def clear_product_form(self):
         self.product_id_entry.delete(0, tk.END)
@@ -222,8 +386,6 @@ class App(tk.Tk):
         if messagebox.askyesno("Подтверждение", f"Удалить товар с ID {product_id}?"):
             if self.db.delete_product(product_id):
                 messagebox.showinfo("Успех", "Товар удалён.")
-                self.load_products()
-                self.load_orders()  
             else:
                 messagebox.showerror("Ошибка", "Не удалось удалить товар.")
 
@@ -243,7 +405,7 @@ class App(tk.Tk):
         self.order_client_id_entry = ttk.Entry(form_frame)
         self.order_client_id_entry.grid(row=1, column=1, sticky="w")
 
-        ttk.Label(form_frame, text="ID товаров (через запятую):").grid(row=2, column=0, sticky="e")
+        ttk.Label(form_frame, text="ID товаров (через запятую, повтор — количество):").grid(row=2, column=0, sticky="e")
         self.order_product_ids_entry = ttk.Entry(form_frame)
         self.order_product_ids_entry.grid(row=2, column=1, sticky="w")
         
@@ -259,21 +421,29 @@ class App(tk.Tk):
 
         ttk.Label(sort_frame, text="Сортировать заказы по:").pack(side="left", padx=5)
         self.sort_var = tk.StringVar(value="date")
-        sort_date_rb = ttk.Radiobutton(sort_frame, text="Дате", variable=self.sort_var, value="date", command=self.load_orders)
+        sort_date_rb = ttk.Radiobutton(sort_frame, text="Дате", variable=self.sort_var, value="date", command=self.sort_orders)
         sort_date_rb.pack(side="left")
-        sort_total_rb = ttk.Radiobutton(sort_frame, text="Стоимость", variable=self.sort_var, value="total", command=self.load_orders)
+        sort_total_rb = ttk.Radiobutton(sort_frame, text="Стоимость", variable=self.sort_var, value="total", command=self.sort_orders)
         sort_total_rb.pack(side="left")
 
+        self.create_order_filters(frame)
+
         list_frame = ttk.LabelFrame(frame, text="Список заказов")
         list_frame.pack(fill="both", expand=True, padx=10, pady=10)
 
+        self.create_search_box(list_frame, self.search_orders)
+
         columns = ("ID заказа", "Клиент", "Товары", "Дата", "Сумма")
-        self.order_tree = ttk.Treeview(list_frame, columns=columns, show="headings")
+        self.order_sort = self.sort_var.get()
+        self.order_list = VirtualTreeview(list_frame, columns, self.fetch_order_rows, self.count_order_rows,
+                                          runner=self.runner, name="Загрузка заказов",
+                                          on_error=self.show_task_error)
+        self.order_tree = self.order_list.tree
         for col in columns:
             self.order_tree.heading(col, text=col)
             width = 150 if col != "Товары" else 300
             self.order_tree.column(col, width=width)
-        self.order_tree.pack(fill="both", expand=True)
+        self.order_list.pack(fill="both", expand=True)
 
         refresh_btn = ttk.Button(list_frame, text="Обновить список", command=self.load_orders)
         refresh_btn.pack(pady=5)
@@ -301,25 +471,18 @@ class App(tk.Tk):
                 return
 
             product_ids = [int(pid.strip()) for pid in product_ids_text.split(",") if pid.strip()]
-            products: List[Product] = []
-            for pid in product_ids:
-                product = self.db.get_product(pid)
-                if not product:
-                    messagebox.showerror("Ошибка", f"Товар с ID {pid} не найден.")
-                    return
-                products.append(product)
+            found = self.db.get_products(product_ids)
+            missing = [pid for pid in dict.fromkeys(product_ids) if pid not in found]
+            if missing:
+                messagebox.showerror("Ошибка", f"Товары с ID {', '.join(map(str, missing))} не найдены.")
+                return
+            products: List[Product] = [found[pid] for pid in product_ids]
                 
             if not date_text:
                 messagebox.showerror("Ошибка", "Введите дату заказа.")
                 return
                 
-            date = None
-            for fmt in ("%d-%m-%Y", "%Y-%m-%d"):
-                try:
-                    date = datetime.strptime(date_text, fmt)
-                    break
-                except ValueError:
-                    continue
+            date = parse_date(date_text)
             if date is None:
                 messagebox.showerror("Ошибка", "Дата должна быть в формате ДД-ММ-ГГГГ или наоборот.")
                 return
@@ -327,7 +490,6 @@ class App(tk.Tk):
             order = Order(order_id, client, products, date)
             if self.db.add_order(order):
                 messagebox.showinfo("Успех", "Заказ создан.")
-                self.load_orders()
                 self.clear_order_form()
             else:
                 messagebox.showerror("Ошибка", "Не удалось создать заказ. ID уже существует.")
@@ -335,16 +497,138 @@ class App(tk.Tk):
             messagebox.showerror("Ошибка", "ID заказа, клиента и товаров должны быть числами.")
 
     def load_orders(self):
-        """Загружает список заказов, сортирует и отображает в таблице."""
-        for row in self.order_tree.get_children():
-            self.order_tree.delete(row)
-        sort_by = self.sort_var.get() if hasattr(self, "sort_var") else "date"
-        orders = self.db.get_all_orders_sorted(sort_by=sort_by)
+        """Обновляет видимую часть списка заказов."""
+        self.order_list.refresh()
+
+    def sort_orders(self):
+        """Перезагружает список заказов с начала в выбранной сортировке."""
+        self.order_sort = self.sort_var.get()
+        self.order_list.reset()
+
+    def create_order_filters(self, frame):
+        """Создаёт панель фильтров списка заказов: клиент, товар, статусы, даты и сумма."""
+        filter_frame = ttk.LabelFrame(frame, text="Фильтр заказов")
+        filter_frame.pack(fill="x", padx=10, pady=(5, 0))
+        fields = [
+            ("client_id", "ID клиента:", 0, 0), ("product_id", "ID товара:", 0, 2),
+            ("statuses", "Статусы (через запятую):", 0, 4),
+            ("date_from", "Дата с:", 1, 0), ("date_to", "Дата по:", 1, 2),
+            ("min_total", "Сумма от:", 2, 0), ("max_total", "Сумма до:", 2, 2),
+        ]
+        self.order_filter_entries = {}
+        for key, text, row, column in fields:
+            ttk.Label(filter_frame, text=text).grid(row=row, column=column, sticky="e", padx=(5, 0))
+            entry = ttk.Entry(filter_frame, width=14)
+            entry.grid(row=row, column=column + 1, sticky="w")
+            entry.bind("<Return>", lambda event: self.apply_order_filters())
+            self.order_filter_entries[key] = entry
+        ttk.Button(filter_frame, text="Применить", command=self.apply_order_filters).grid(row=1, column=4, pady=2)
+        ttk.Button(filter_frame, text="Сбросить", command=self.reset_order_filters).grid(row=2, column=4, pady=2)
+
+    def apply_order_filters(self):
+        """Проверяет значения фильтров и перезагружает список заказов."""
+        values = {key: entry.get().strip() for key, entry in self.order_filter_entries.items()}
+        filters = {}
+        try:
+            for key in ("client_id", "product_id"):
+                if values[key]:
+                    filters[key] = int(values[key])
+            for key in ("min_total", "max_total"):
+                if values[key]:
+                    filters[key] = float(values[key])
+        except ValueError:
+            messagebox.showerror("Ошибка", "ID клиента и товара должны быть целыми числами, суммы — числами.")
+            return
+        for key in ("date_from", "date_to"):
+            if values[key]:
+                parsed = parse_date(values[key])
+                if parsed is None:
+                    messagebox.showerror("Ошибка", "Дата должна быть в формате ДД-ММ-ГГГГ или ГГГГ-ММ-ДД.")
+                    return
+                filters[key] = parsed.date()
+        if values["statuses"]:
+            filters["statuses"] = [s.strip() for s in values["statuses"].split(",") if s.strip()]
+        self.order_filters = filters
+        self.order_list.reset()
+
+    def reset_order_filters(self):
+        """Очищает фильтры и показывает все заказы."""
+        for entry in self.order_filter_entries.values():
+            entry.delete(0, tk.END)
+        self.order_filters = {}
+        self.order_list.reset()
+
+    def make_order_query(self) -> OrderQuery:
+        """Собирает запрос заказов из сортировки, фильтров и строки поиска (безопасно в рабочем потоке)."""
+        filters = self.order_filters
+        query = OrderQuery(self.order_sort)
+        if "client_id" in filters:
+            query.client(filters["client_id"])
+        if "product_id" in filters:
+            query.product(filters["product_id"])
+        if "statuses" in filters:
+            query.statuses(filters["statuses"])
+        query.date_range(filters.get("date_from"), filters.get("date_to"))
+        query.total_range(filters.get("min_total"), filters.get("max_total"))
+        if self.order_search:
+            query.search(self.order_search)
+        return query
+
+    def search_orders(self, text: str):
+        """Показывает заказы, у которых клиент или товары подходят под строку поиска."""
+        self.order_search = text
+        self.order_list.reset()
+
+    def count_order_rows(self) -> int:
+        """Возвращает число строк в таблице заказов с учётом фильтров и поиска."""
+        if self.order_search or self.order_filters:
+            return self.db.count_matching_orders(self.make_order_query())
+        return self.db.count_orders()
+
+    def order_query_state(self) -> Optional[tuple]:
+        """Возвращает отпечаток запроса таблицы заказов и версии данных, при котором позиции
+        строк не меняются; None, если версия данных неизвестна."""
+        version = self.db.get_data_version()
+        if version is None:
+            return None
+        filters = tuple(sorted((key, tuple(value) if isinstance(value, list) else value)
+                               for key, value in self.order_filters.items()))
+        return self.order_sort, filters, self.order_search, version
+
+    def nearest_order_anchor(self, state: tuple, offset: int) -> Tuple[int, Optional[tuple]]:
+        """Находит запомненный курсор с наибольшей позицией не дальше offset: (позиция, курсор)."""
+        best = (0, None)
+        with self.order_anchors_lock:
+            anchors = list(self.order_anchors.items())
+        for (anchor_state, position), cursor in anchors:
+            if anchor_state == state and best[0] < position <= offset:
+                best = (position, cursor)
+        return best
+
+    def fetch_order_rows(self, offset: int, limit: int):
+        """Возвращает строки таблицы заказов начиная с позиции offset (вызывается в рабочем потоке).
+
+        Чтобы при глубокой прокрутке не пропускать offset строк индекса, страница
+        читается по курсору ближайшей уже загруженной страницы (after=) со
+        смещением от неё.
+        """
+        state = self.order_query_state()
+        position, cursor = self.nearest_order_anchor(state, offset) if state else (0, None)
+        orders, next_cursor = self.db.find_orders(self.make_order_query(), limit=limit,
+                                                  offset=offset - position, after=cursor)
+        if state and next_cursor is not None:
+            with self.order_anchors_lock:
+                self.order_anchors[(state, offset + limit)] = next_cursor
+                while len(self.order_anchors) > ORDER_CURSOR_ANCHORS:
+                    self.order_anchors.popitem(last=False)
+        rows = []
         for o in orders:
-            products_names = ", ".join([p.name for p in o.products])
+            products_names = ", ".join([item.product.name if item.quantity == 1
+                                        else f"{item.product.name} x{item.quantity}" for item in o.items])
             order_date = o.date.strftime("%d-%m-%Y %H:%M:%S")
             total = f"{o.total_price():.2f}"
-            self.order_tree.insert("", "end", values=(o.order_id, o.client.name, products_names, order_date, total))
+            rows.append((str(o.order_id), (o.order_id, o.client.name, products_names, order_date, total)))
+        return rows
 
     def clear_order_form(self):
         """Очищает поля формы создания заказа."""
@@ -363,7 +647,6 @@ class App(tk.Tk):
         if messagebox.askyesno("Подтверждение", f"Удалить заказ с ID {order_id}?"):
             if self.db.delete_order(order_id):
                 messagebox.showinfo("Успех", "Заказ удалён.")
-                self.load_orders()
             else:
                 messagebox.showerror("Ошибка", "Не удалось удалить заказ.")
                 
@@ -384,32 +667,50 @@ class App(tk.Tk):
         btn_clients_graph.pack(fill="x", padx=20, pady=5)
 
 
+    def run_analysis(self, compute, draw, name: str):
+        """Выполняет вычисления для графика в фоне; рисует график в главном потоке.
+
+        compute(task) возвращает данные для draw или None, если данных нет.
+        """
+        def show(result):
+            if result is None:
+                messagebox.showinfo("Информация", "Нет данных для отображения.")
+                return
+            draw(result)
+
+        self.runner.submit(compute, on_success=show, on_error=self.show_task_error, name=name)
+
     def show_top_clients(self):
         """Отображает график топ 5 клиентов по числу заказов."""
-        orders = self.db.get_all_orders()
-        if not orders:
-            messagebox.showinfo("Информация", "Нет данных для отображения.")
-            return
-        plot_top_clients_by_orders(orders, top_n=5)
+        def compute(task):
+            task.report_progress(None, "Чтение сводной таблицы клиентов")
+            top = top_clients_by_orders(self.db, top_n=5)
+            return None if top.empty else top
 
+        self.run_analysis(compute, lambda data: draw_top_clients(data, top_n=5), "Топ клиентов")
 
     def show_orders_dynamics(self):
         """Отображает график динамики количества заказов по датам."""
-        orders = self.db.get_all_orders()
-        if not orders:
-            messagebox.showinfo("Информация", "Нет данных для отображения.")
-            return
-        plot_orders_dynamics(orders)
+        def compute(task):
+            task.report_progress(None, "Чтение сводной таблицы по датам")
+            per_date = orders_per_date(self.db)
+            return None if per_date.empty else per_date
+
+        self.run_analysis(compute, draw_orders_dynamics, "Динамика заказов")
+
+    def graph_layout_path(self) -> Optional[str]:
+        """Файл расположения узлов графа клиентов рядом с файлом базы (None для базы в памяти)."""
+        if self.db.db_name == ":memory:":
+            return None
+        return os.path.abspath(self.db.db_name) + GRAPH_LAYOUT_SUFFIX
 
     def show_clients_graph(self):
         """Строит и отображает граф связей клиентов по общим товарам."""
-        orders = self.db.get_all_orders()
-        clients = self.db.get_all_clients()
-        if not orders or not clients:
-            messagebox.showinfo("Информация", "Нет данных для отображения.")
-            return
-        G = build_clients_graph(orders)
-        plot_clients_graph(G, clients)
+        def compute(task):
+            task.report_progress(None, "Построение графа и расположения узлов")
+            return clients_graph_view_from_db(self.db, layout_path=self.graph_layout_path())
+
+        self.run_analysis(compute, draw_graph_view, "Граф клиентов")
 
 if __name__ == "__main__":
     app = App()
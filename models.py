@@ -5,10 +5,44 @@
 
 
 import re
+import sys
+import weakref
 from datetime import datetime
+from typing import Iterable, Optional
+
+EMAIL_PATTERN = re.compile(r'^[\w\.-]+@[\w\.-]+\.\w+$')
+PHONE_PATTERN = re.compile(r'^\+?\d{10,15}$')
+
+# Коды ошибок проверки контактных данных: битовые флаги, 0 — ошибок нет
+CONTACT_OK = 0
+CONTACT_EMPTY_NAME = 1
+CONTACT_BAD_EMAIL = 2
+CONTACT_BAD_PHONE = 4
+CONTACT_ERROR_MESSAGES = {
+    CONTACT_EMPTY_NAME: "пустое имя",
+    CONTACT_BAD_EMAIL: "неверный email",
+    CONTACT_BAD_PHONE: "неверный телефон",
+}
+
+def contact_error_code(name: str, email: str, phone: str) -> int:
+    """Проверяет контактные данные и возвращает код ошибок (CONTACT_OK, если всё верно)."""
+    code = CONTACT_OK
+    if not name:
+        code |= CONTACT_EMPTY_NAME
+    if not email or EMAIL_PATTERN.match(email) is None:
+        code |= CONTACT_BAD_EMAIL
+    if not phone or PHONE_PATTERN.match(phone) is None:
+        code |= CONTACT_BAD_PHONE
+    return code
+
+def describe_contact_errors(code: int) -> str:
+    """Возвращает текстовое описание кода ошибок контактных данных."""
+    return ", ".join(message for flag, message in CONTACT_ERROR_MESSAGES.items() if code & flag)
 
 class Person:
     """Класс для описания человека с контактными данными"""
+    __slots__ = ("name", "email", "phone")
+
     def __init__(self, name: str, email: str, phone: str):
         self.name = name
         self.email = email
@@ -16,13 +50,11 @@ class Person:
 
     def validate_email(self) -> bool:
         """Проверка корректность email"""
-        pattern = r'^[\w\.-]+@[\w\.-]+\.\w+$'
-        return re.match(pattern, self.email) is not None
+        return EMAIL_PATTERN.match(self.email) is not None
 
     def validate_phone(self) -> bool:
         """Проверяет корректность номера телефона (10-15 цифр)"""
-        pattern = r'^\+?\d{10,15}$'
-        return re.match(pattern, self.phone) is not None
+        return PHONE_PATTERN.match(self.phone) is not None
 
     def str(self) -> str:
         """Возвращает строковое представление объекта"""
@@ -30,6 +62,8 @@ class Person:
 
 class Client(Person):
     """Класс клиента, который наследует Person, добавляет client_id"""
+    __slots__ = ("client_id",)
+
     def __init__(self, client_id: int, name: str, email: str, phone: str):
         self.client_id = client_id
         self.name = name
@@ -46,6 +80,8 @@ class Client(Person):
 
 class Product:
     """Класс для описания товара"""
+    __slots__ = ("product_id", "name", "price", "__weakref__")
+
     def __init__(self, product_id: int, name: str, price: float):
         self.product_id = product_id
         self.name = name
@@ -55,22 +91,188 @@ class Product:
         """Строковое представление товара"""
         return f"{self.name} (ID: {self.product_id}, Цена: {self.price})"
 
+class OrderItem:
+    """Позиция заказа: товар, количество и цена за единицу на момент заказа.
+
+    Позиция не изменяется после создания: чтобы поменять количество или цену,
+    замените её в Order.items новой позицией. Поэтому одинаковые позиции
+    могут разделяться между заказами.
+    """
+    __slots__ = ("product", "quantity", "unit_price")
+
+    def __init__(self, product: Product, quantity: int = 1, unit_price: Optional[float] = None):
+        self.product = product
+        self.quantity = quantity
+        self.unit_price = product.price if unit_price is None else unit_price
+
+    def total(self) -> float:
+        """Стоимость позиции"""
+        return self.quantity * self.unit_price
+
+class ProductRegistry:
+    """Реестр товаров: один объект Product на product_id, пока он где-то используется.
+
+    Повторная загрузка товара возвращает уже существующий объект (его имя и
+    цена обновляются), поэтому заказы разделяют одни и те же объекты товаров.
+    """
+    def __init__(self):
+        self._products = weakref.WeakValueDictionary()
+
+    def intern(self, product_id: int, name: str, price: float) -> Product:
+        """Возвращает общий объект товара с указанными данными."""
+        product = self._products.get(product_id)
+        if product is None:
+            product = Product(product_id, name, price)
+            self._products[product_id] = product
+        else:
+            product.name = name
+            product.price = price
+        return product
+
+    def get(self, product_id: int) -> Optional[Product]:
+        """Возвращает объект товара из реестра или None."""
+        return self._products.get(product_id)
+
+    def clear(self):
+        """Очищает реестр."""
+        self._products.clear()
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+class OrderItems(list):
+    """Список позиций заказа, который сбрасывает кешированную сумму заказа при изменении."""
+    __slots__ = ("_order",)
+
+    def __init__(self, order: "Order", items=()):
+        super().__init__(items)
+        self._order = order
+
+    def _changed(self):
+        self._order._total = None
+
+    def append(self, item):
+        super().append(item)
+        self._changed()
+
+    def extend(self, items):
+        super().extend(items)
+        self._changed()
+
+    def insert(self, index, item):
+        super().insert(index, item)
+        self._changed()
+
+    def remove(self, item):
+        super().remove(item)
+        self._changed()
+
+    def pop(self, index=-1):
+        item = super().pop(index)
+        self._changed()
+        return item
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self._changed()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._changed()
+
+    def __iadd__(self, items):
+        result = super().__iadd__(items)
+        self._changed()
+        return result
+
+    def __imul__(self, count):
+        result = super().__imul__(count)
+        self._changed()
+        return result
+
+    def __reduce_ex__(self, protocol):
+        return list, (list(self),)
+
+def order_items(products: Iterable) -> list[OrderItem]:
+    """Превращает список товаров и/или позиций в позиции заказа.
+
+    Товары (Product) становятся позициями по текущей цене; повторы одного
+    товара объединяются в одну позицию с количеством.
+    """
+    items = []
+    by_product = {}
+    for entry in products:
+        item = entry if isinstance(entry, OrderItem) else OrderItem(entry)
+        pid = item.product.product_id
+        index = by_product.get(pid)
+        if index is None:
+            by_product[pid] = len(items)
+            items.append(item)
+        else:
+            first = items[index]
+            items[index] = OrderItem(first.product, first.quantity + item.quantity, first.unit_price)
+    return items
+
 class Order:
     """Класс заказа"""
-    def __init__(self, order_id: int, client: Client, products: list[Product], date: datetime = None, status: str ="Новый"):
+    __slots__ = ("order_id", "client", "_items", "date", "status", "_total")
+
+    def __init__(self, order_id: int, client: Client, products: list, date: datetime = None, status: str ="Новый"):
+        """products — товары (Product) и/или позиции (OrderItem); см. order_items."""
         self.order_id = order_id
         self.client = client
-        self.products = products  
+        self._total = None
+        self.items = order_items(products)
         self.date = date or datetime.now()
-        self.status = status
+        self.status = sys.intern(status)  # статусов немного: одна строка на все заказы
+
+    @property
+    def items(self) -> list[OrderItem]:
+        """Позиции заказа; изменение списка сбрасывает кешированную сумму"""
+        return self._items
+
+    @items.setter
+    def items(self, items: list[OrderItem]):
+        self._items = OrderItems(self, items)
+        self._total = None
+
+    @property
+    def products(self) -> tuple[Product, ...]:
+        """Товары заказа, по одному на позицию; кортеж, поэтому изменять заказ нужно через items
+        или присваиванием order.products"""
+        return tuple(item.product for item in self._items)
+
+    @products.setter
+    def products(self, products: list):
+        self.items = order_items(products)
 
     def total_price(self) -> float:
-        """Считает общую стоимость заказа"""
-        return sum(p.price for p in self.products)
+        """Считает общую стоимость заказа по ценам на момент заказа (результат кешируется до изменения позиций)"""
+        if self._total is None:
+            self._total = sum(item.quantity * item.unit_price for item in self._items)
+        return self._total
+
+    def __getstate__(self):
+        return None, {"order_id": self.order_id, "client": self.client, "items": list(self._items),
+                      "date": self.date, "status": self.status}
+
+    def __setstate__(self, state):
+        _, slots = state
+        self.order_id = slots["order_id"]
+        self.client = slots["client"]
+        self._total = None
+        self.items = slots["items"]
+        self.date = slots["date"]
+        self.status = sys.intern(slots["status"])
 
     def str(self):
         """Строковое представление заказа"""
-        product_list = ', '.join([p.name for p in self.products])
+        product_list = ', '.join([item.product.name if item.quantity == 1
+                                  else f"{item.product.name} x{item.quantity}" for item in self.items])
         return (f"Заказ {self.order_id} от {self.date.strftime('%d-%m-%Y %H:%M:%S')}\n"
                 f"Клиент: {self.client.name}\n"
                 f"Товары: {product_list}\n"
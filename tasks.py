@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+POLL_INTERVAL_MS = 50  # как часто главный поток забирает результаты фоновых задач
+MAX_WORKERS = 2
+
+
+class TaskCancelled(Exception):
+    """Исключение, которым фоновая задача прерывается после отмены."""
+
+
+class Task:
+    """Фоновая задача: флаг отмены и передача прогресса в главный поток."""
+    def __init__(self, runner: "TaskRunner", name: str):
+        self.runner = runner
+        self.name = name
+        self.future = None
+        self.on_cancel: Optional[Callable] = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        """Возвращает True, если задачу отменили."""
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Отменяет задачу: результат не будет передан в интерфейс, вместо него
+        в главном потоке один раз вызывается on_cancel."""
+        if self.cancelled:
+            return
+        self._cancel_event.set()
+        if self.future is not None:
+            self.future.cancel()
+        self.runner.call_soon(self.runner._cancelled, self)
+
+    def check_cancelled(self):
+        """Прерывает выполнение задачи исключением TaskCancelled, если её отменили."""
+        if self.cancelled:
+            raise TaskCancelled(self.name)
+
+    def report_progress(self, fraction: Optional[float] = None, message: str = ""):
+        """Сообщает о прогрессе (доля от 0 до 1 или None, если неизвестна) и проверяет отмену."""
+        self.check_cancelled()
+        if self.runner.on_progress:
+            self.runner.call_soon(self.runner.on_progress, self, fraction, message)
+
+
+class TaskRunner:
+    """Выполняет функции в пуле потоков и передаёт результаты в главный цикл Tk через after().
+
+    Функция задачи вызывается как func(task, *args) в рабочем потоке; обработчики
+    on_success и on_error, а также on_progress и on_tasks_changed вызываются
+    только в главном потоке, поэтому в них можно работать с виджетами.
+    """
+    def __init__(self, root, max_workers: int = MAX_WORKERS, poll_interval: int = POLL_INTERVAL_MS):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shop-task")
+        self.tasks = []
+        self.on_progress: Optional[Callable] = None
+        self.on_tasks_changed: Optional[Callable] = None
+        self._queue = queue.Queue()
+        self._closed = False
+        self.root.after(self.poll_interval, self._poll)
+
+    def submit(self, func: Callable, *args, on_success: Optional[Callable] = None,
+               on_error: Optional[Callable] = None, on_cancel: Optional[Callable] = None,
+               name: str = "") -> Task:
+        """Запускает func(task, *args) в фоне и возвращает объект задачи.
+
+        Завершённая задача вызывает ровно один обработчик: on_success, on_error
+        или, если её отменили, on_cancel (без аргументов).
+        """
+        task = Task(self, name)
+        task.on_cancel = on_cancel
+        self.tasks.append(task)
+        if self.on_tasks_changed:
+            self.on_tasks_changed(self.tasks)
+
+        def run():
+            try:
+                task.check_cancelled()
+                result = func(task, *args)
+            except TaskCancelled:
+                return
+            except Exception as e:
+                self.call_soon(self._complete, task, on_error, e)
+                return
+            self.call_soon(self._complete, task, on_success, result)
+
+        task.future = self.executor.submit(run)
+        return task
+
+    def call_soon(self, callback: Callable, *args):
+        """Ставит вызов callback(*args) в очередь главного потока; безопасно из любого потока."""
+        self._queue.put((callback, args))
+
+    def cancel_all(self):
+        """Отменяет все выполняющиеся задачи."""
+        for task in list(self.tasks):
+            task.cancel()
+
+    def shutdown(self):
+        """Отменяет задачи и останавливает пул потоков, не дожидаясь их завершения."""
+        self._closed = True
+        self.cancel_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _complete(self, task: Task, callback: Optional[Callable], value):
+        """Передаёт результат задачи обработчику, если задача не отменена."""
+        cancelled = task.cancelled
+        self._finish(task)
+        if callback and not cancelled:
+            callback(value)
+
+    def _cancelled(self, task: Task):
+        """Убирает отменённую задачу и сообщает об отмене её обработчику."""
+        self._finish(task)
+        if task.on_cancel:
+            task.on_cancel()
+
+    def _finish(self, task: Task):
+        """Убирает задачу из списка активных."""
+        if task in self.tasks:
+            self.tasks.remove(task)
+            if self.on_tasks_changed:
+                self.on_tasks_changed(self.tasks)
+
+    def _poll(self):
+        """Выполняет накопившиеся вызовы из рабочих потоков и планирует следующий опрос."""
+        try:
+            while True:
+                try:
+                    callback, args = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                callback(*args)
+        finally:
+            if not self._closed:
+                self.root.after(self.poll_interval, self._poll)
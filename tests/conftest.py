@@ -0,0 +1,7 @@
+import os
+import sys
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+# Модули проекта лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
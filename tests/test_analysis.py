@@ -0,0 +1,62 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import networkx as nx
+import pytest
+
+import analysis
+from analysis import clients_graph_layout, orders_per_date, revenue_per_product, top_clients_by_orders
+from db import Database
+
+
+@pytest.fixture
+def old_db(tmp_path):
+    """База со схемой 1: в order_products ещё нет quantity и unit_price."""
+    db = Database(os.path.join(tmp_path, "old.db"), schema_version=1)
+    db.conn.executemany("INSERT INTO clients VALUES (?, ?, ?, ?)",
+                        [(1, "Анна", "anna@mail.ru", "+79990000001"),
+                         (2, "Борис", "boris@mail.ru", "+79990000002")])
+    db.conn.executemany("INSERT INTO products VALUES (?, ?, ?)", [(10, "Чай", 100.0), (20, "Кофе", 250.0)])
+    db.conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?)",
+                        [(1, 1, "2024-01-01 10:00:00", "new"),
+                         (2, 1, "2024-01-02 11:00:00", "new"),
+                         (3, 2, "2024-01-02 12:00:00", "done")])
+    db.conn.executemany("INSERT INTO order_products VALUES (?, ?)", [(1, 10), (1, 20), (2, 20), (3, 10)])
+    db.conn.commit()
+    yield db
+    db.close()
+
+
+def test_stats_on_schema_before_quantity(old_db):
+    assert old_db.get_schema_version() == 1
+
+    top = top_clients_by_orders(old_db)
+    assert list(zip(top["client_id"], top["order_id"])) == [(1, 2), (2, 1)]
+
+    dates = orders_per_date(old_db)
+    assert list(dates["order_id"]) == [1, 2]
+    assert list(dates["revenue"]) == [350.0, 350.0]
+
+    products = revenue_per_product(old_db).set_index("product_id")
+    assert products.loc[20, "revenue"] == 500.0
+    assert products.loc[10, "units"] == 2
+
+
+def test_parallel_stats_on_schema_before_quantity(old_db):
+    top = top_clients_by_orders(old_db, workers=2)
+    assert list(zip(top["client_id"], top["order_id"])) == [(1, 2), (2, 1)]
+    assert revenue_per_product(old_db, workers=2)["revenue"].sum() == 700.0
+
+
+def test_graph_layout_cache_from_threads(tmp_path):
+    graphs = [nx.path_graph(range(i, i + 5)) for i in range(3 * analysis.LAYOUT_CACHE_SIZE)]
+    with ThreadPoolExecutor(8) as pool:
+        layouts = list(pool.map(clients_graph_layout, graphs * 2))
+    assert all(set(pos) == set(G) for pos, G in zip(layouts, graphs * 2))
+    assert len(analysis._layout_cache) == analysis.LAYOUT_CACHE_SIZE
+
+    path = os.path.join(tmp_path, "shop.db.graph_layout.json")
+    G = nx.cycle_graph(7)
+    pos = clients_graph_layout(G, path)
+    analysis._layout_cache.clear()
+    assert {k: list(v) for k, v in clients_graph_layout(G, path).items()} == {k: list(v) for k, v in pos.items()}
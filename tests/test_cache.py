@@ -0,0 +1,46 @@
+import glob
+import os
+
+from cache import ResultCache
+from db import Database
+
+
+def client_names(db):
+    return [client.name for client in db.get_all_clients()]
+
+
+def make_db(path, name):
+    db = Database(path)
+    db.bulk_import_clients([{"client_id": i, "name": f"{name} {i}", "email": f"user{i}@mail.ru",
+                             "phone": f"+7999{i:07d}"} for i in range(1, 4)])
+    return db
+
+
+def test_disk_cache_survives_restart(tmp_path):
+    path, directory = os.path.join(tmp_path, "shop.db"), os.path.join(tmp_path, "cache")
+    db = make_db(path, "Анна")
+    assert ResultCache(directory=directory).call(db, client_names)[0] == "Анна 1"
+
+    restarted = ResultCache(directory=directory)
+    assert restarted.call(db, client_names)[0] == "Анна 1"
+    assert restarted.stats()["hits"] == 1
+    db.close()
+
+
+def test_recreated_db_does_not_reuse_disk_cache(tmp_path):
+    path, directory = os.path.join(tmp_path, "shop.db"), os.path.join(tmp_path, "cache")
+    db = make_db(path, "Анна")
+    version, identity = db.get_data_version(), db.get_db_identity()
+    assert identity
+    assert ResultCache(directory=directory).call(db, client_names)[0] == "Анна 1"
+    db.close()
+    os.remove(path)
+
+    db = make_db(path, "Борис")  # тот же путь и та же версия данных, но другие данные
+    assert db.get_data_version() == version
+    assert db.get_db_identity() != identity
+    cache = ResultCache(directory=directory)
+    assert cache.call(db, client_names)[0] == "Борис 1"
+    assert cache.stats()["misses"] == 1
+    assert len(glob.glob(os.path.join(directory, "*.pkl"))) == 1  # файлы прежней базы удалены
+    db.close()
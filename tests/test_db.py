@@ -0,0 +1,122 @@
+import io
+import json
+import os
+
+import pytest
+
+import db as db_module
+from db import Database, EntityCache, _iter_json_array
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(os.path.join(tmp_path, "shop.db"))
+    yield database
+    database.close()
+
+
+def _clients(ids, name="Клиент"):
+    return [{"client_id": i, "name": f"{name} {i}", "email": f"user{i}@mail.ru",
+             "phone": f"+7999{i:07d}"} for i in ids]
+
+
+def _fts_integrity(db, fts_table):
+    db.conn.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('integrity-check')")
+
+
+def test_search_finds_bulk_imported_rows(db):
+    report = db.bulk_import_clients(_clients(range(1, 1201), "Иванов"), batch_size=500)
+    assert report.inserted == 1200
+    assert len(db.search_clients("иванов", limit=5000)) == 1200
+    assert [c.client_id for c in db.search_clients("user777@mail.ru")] == [777]
+
+    report = db.bulk_import_products([{"product_id": i, "name": f"Ноутбук {i}", "price": 100.0}
+                                      for i in range(1, 301)], batch_size=128)
+    assert report.inserted == 300
+    assert len(db.search_products("ноутбук", limit=1000)) == 300
+    _fts_integrity(db, "clients_fts")
+    _fts_integrity(db, "products_fts")
+
+
+def test_search_after_bulk_upsert_and_skip(db):
+    db.bulk_import_clients(_clients(range(1, 101), "Петров"))
+    db.bulk_import_clients(_clients(range(51, 151), "Сидоров"), on_conflict="upsert")
+    assert len(db.search_clients("петров", limit=1000)) == 50
+    assert len(db.search_clients("сидоров", limit=1000)) == 100
+
+    report = db.bulk_import_clients(_clients(range(141, 161), "Смирнов"), on_conflict="skip")
+    assert (report.inserted, report.duplicates) == (10, 10)
+    assert len(db.search_clients("смирнов", limit=1000)) == 10
+    _fts_integrity(db, "clients_fts")
+
+
+def test_fts_triggers_restored_after_bulk_import(db):
+    db.bulk_import_clients(_clients(range(1, 11)))
+    db.bulk_import_clients(_clients([5]), on_conflict="fail")  # пакет откатывается целиком
+    triggers = {row[0] for row in db.conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_clients_fts_%'")}
+    assert triggers == {"trg_clients_fts_insert", "trg_clients_fts_delete", "trg_clients_fts_update"}
+
+    db.conn.execute("UPDATE clients SET name = 'Козлов' WHERE client_id = 3")
+    db.conn.commit()
+    assert [c.client_id for c in db.search_clients("козлов")] == [3]
+    _fts_integrity(db, "clients_fts")
+
+
+JSON_ITEMS = [
+    {"product_id": 1, "name": "Скобки ],[ внутри строки", "price": 10.5},
+    {"product_id": 22, "name": "Вложенные", "tags": [[1, 2], [3, [4, "],["]]], "price": 7},
+    {"product_id": 333, "name": "Ünïcödé — ёлка 🎄", "price": 1234567.25},
+    [],
+    12345678901234567890,
+    -0.5e-3,
+    "строка с \"кавычками\" и \\",
+    None,
+]
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 5, 7, 64])
+@pytest.mark.parametrize("indent", [None, 4])
+def test_iter_json_array_small_reads(read_size, indent):
+    text = json.dumps(JSON_ITEMS, ensure_ascii=False, indent=indent)
+    assert list(_iter_json_array(io.StringIO(text), read_size)) == JSON_ITEMS
+
+
+@pytest.mark.parametrize("read_size", [1, 4])
+def test_iter_json_array_number_at_block_end(read_size):
+    assert list(_iter_json_array(io.StringIO("[123456,7890]"), read_size)) == [123456, 7890]
+    assert list(_iter_json_array(io.StringIO(" [ ] "), read_size)) == []
+
+
+@pytest.mark.parametrize("text", ["", "{}", "[1, 2", "[1 2]", "[1,]"])
+def test_iter_json_array_rejects_malformed(text):
+    with pytest.raises(ValueError):
+        list(_iter_json_array(io.StringIO(text), 2))
+
+
+def test_entity_cache_skips_put_after_invalidation():
+    cache = EntityCache(10)
+    generation = cache.generation()
+    cache.invalidate("client", [1])
+    cache.put("client", 1, "устаревший", generation)
+    assert cache.get("client", 1) is None
+    cache.put("client", 1, "свежий", cache.generation())
+    assert cache.get("client", 1) == "свежий"
+
+
+@pytest.mark.parametrize("read", [lambda db: db.get_client(1), lambda db: db.get_clients([1])[1]])
+def test_entity_cache_not_poisoned_by_concurrent_write(tmp_path, monkeypatch, read):
+    database = Database(os.path.join(tmp_path, "shop.db"), entity_cache_size=100)
+    database.bulk_import_clients(_clients([1], "Старое"))
+    real_client = db_module.Client
+
+    def client_after_write(*args):
+        # Запись и сброс кеша успевают между SELECT и put() читающего потока
+        monkeypatch.setattr(db_module, "Client", real_client)
+        database.bulk_import_clients(_clients([1], "Новое"), on_conflict="upsert")
+        return real_client(*args)
+
+    monkeypatch.setattr(db_module, "Client", client_after_write)
+    assert read(database).name == "Старое 1"
+    assert database.get_client(1).name == "Новое 1"
+    database.close()
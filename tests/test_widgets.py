@@ -0,0 +1,133 @@
+import pytest
+
+from widgets import VirtualTreeview
+
+
+class FakeTree:
+    """Минимальная замена ttk.Treeview: хранит только порядок iid."""
+    def __init__(self):
+        self.rows = []
+
+    def get_children(self):
+        return tuple(self.rows)
+
+    def delete(self, *iids):
+        self.rows = [iid for iid in self.rows if iid not in iids]
+
+    def insert(self, parent, index, iid, values):
+        self.rows.insert(index, iid)
+
+    def item(self, iid, values):
+        pass
+
+    def index(self, iid):
+        return self.rows.index(iid)
+
+    def move(self, iid, parent, index):
+        self.rows.remove(iid)
+        self.rows.insert(index, iid)
+
+
+class FakeScrollbar:
+    def set(self, first, last):
+        pass
+
+
+class QueuedRunner:
+    """Откладывает задачи до явного вызова run/cancel, как пул потоков до опроса after()."""
+    def __init__(self):
+        self.pending = []
+
+    def submit(self, func, on_success=None, on_error=None, on_cancel=None, name=""):
+        self.pending.append((func, on_success, on_cancel))
+
+    def run(self):
+        func, on_success, _ = self.pending.pop(0)
+        on_success(func())
+
+    def cancel(self):
+        _, _, on_cancel = self.pending.pop(0)
+        on_cancel()
+
+
+def make_view(data, runner=None, visible=10, buffer=5):
+    view = VirtualTreeview.__new__(VirtualTreeview)
+    view.fetch_rows = lambda offset, limit: data[offset:offset + limit]
+    view.count_rows = lambda: len(data)
+    view.runner = runner
+    view.buffer = buffer
+    view.name = "test"
+    view.on_error = None
+    view.tree = FakeTree()
+    view.scrollbar = FakeScrollbar()
+    view.total = view.top = view.cache_start = view.generation = 0
+    view.visible = visible
+    view.cache = []
+    view.shown = {}
+    view.loading = False
+    view._pending_recount = False
+    return view
+
+
+def rows(n):
+    return [(str(i), (i,)) for i in range(n)]
+
+
+def test_stale_total_does_not_reload_forever():
+    data = rows(100)
+    view = make_view(data)
+    view.refresh()
+    view.scroll_to(90)
+    del data[20:]  # строки удалены в другом месте, счётчик таблицы не обновлялся
+    view.scroll_to(60)
+    assert view.total == 20
+    assert view.top == 10
+    assert view.tree.get_children() == tuple(str(i) for i in range(10, 20))
+    assert not view.loading
+
+
+def test_short_page_at_end_sets_total():
+    data = rows(30)
+    view = make_view(data)
+    view.total = 1000
+    view.scroll_to(500)
+    assert view.total == 30
+    assert view.tree.get_children() == tuple(str(i) for i in range(20, 30))
+
+
+@pytest.mark.parametrize("update", [
+    lambda view: view.rows_added(1),
+    lambda view: view.rows_changed(["3"]),
+    lambda view: view.rows_deleted(["3"]),
+])
+def test_row_updates_keep_pending_recount(update):
+    data = rows(50)
+    runner = QueuedRunner()
+    view = make_view(data, runner)
+    view.refresh()
+    runner.run()
+    assert view.total == 50
+
+    data.extend(rows(100)[50:])  # пока refresh() ждёт в очереди, строк стало больше
+    view.refresh()
+    update(view)
+    while runner.pending:
+        runner.run()
+    assert view.total == len(data)
+    assert not view._pending_recount
+
+
+def test_cancelled_refresh_recounts_on_next_load():
+    data = rows(50)
+    runner = QueuedRunner()
+    view = make_view(data, runner)
+    view.refresh()
+    runner.run()
+    data.extend(rows(100)[50:])
+    view.refresh()
+    runner.cancel()
+    assert not view.loading and view._pending_recount
+    view.scroll_to(40)  # за пределами буфера — нужна новая загрузка
+    runner.run()
+    assert view.total == 100
+    assert not view._pending_recount
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+import numpy as np
+import pandas as pd
+from typing import Optional
+from models import (EMAIL_PATTERN, PHONE_PATTERN, CONTACT_OK, CONTACT_EMPTY_NAME, CONTACT_BAD_EMAIL,
+                    CONTACT_BAD_PHONE, describe_contact_errors)
+
+VALIDATION_CHUNK_SIZE = 100000  # строк CSV, проверяемых за один раз
+
+
+def validate_contacts_series(names: pd.Series, emails: pd.Series, phones: pd.Series) -> pd.Series:
+    """Проверяет столбцы имён, email и телефонов целиком и возвращает коды ошибок по строкам.
+
+    Коды — битовые флаги models.CONTACT_* (CONTACT_OK, если строка верна);
+    индекс результата совпадает с индексом names.
+    """
+    codes = np.zeros(len(names), dtype=np.uint8)
+    codes[(names.fillna("").astype(str).str.len() == 0).to_numpy()] |= CONTACT_EMPTY_NAME
+    codes[_mismatch(emails, EMAIL_PATTERN)] |= CONTACT_BAD_EMAIL
+    codes[_mismatch(phones, PHONE_PATTERN)] |= CONTACT_BAD_PHONE
+    return pd.Series(codes, index=names.index, name="error_code")
+
+
+def _mismatch(values: pd.Series, pattern) -> np.ndarray:
+    """Возвращает маску значений, которые пусты или не соответствуют шаблону."""
+    matched = values.fillna("").astype(str).str.match(pattern).to_numpy(dtype=bool)
+    return ~matched
+
+
+def validate_clients_frame(df: pd.DataFrame) -> pd.Series:
+    """Возвращает коды ошибок контактных данных для таблицы клиентов (столбцы name, email, phone)."""
+    return validate_contacts_series(df["name"], df["email"], df["phone"])
+
+
+def validate_clients_csv(filepath: str, chunk_size: int = VALIDATION_CHUNK_SIZE,
+                         errors_only: bool = True) -> Optional[pd.Series]:
+    """Проверяет CSV файл клиентов порциями по chunk_size строк, не загружая его целиком.
+
+    Возвращает коды ошибок, проиндексированные номером строки файла (заголовок —
+    строка 1); при errors_only=True — только для строк с ошибками.
+    """
+    try:
+        reader = pd.read_csv(filepath, usecols=["name", "email", "phone"], dtype=str,
+                             keep_default_na=False, chunksize=chunk_size)
+        parts = []
+        for chunk in reader:
+            codes = validate_clients_frame(chunk)
+            codes.index = codes.index + 2
+            parts.append(codes[codes != CONTACT_OK] if errors_only else codes)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка чтения файла {filepath}: {e}")
+        return None
+    if not parts:
+        return pd.Series([], dtype=np.uint8, name="error_code")
+    return pd.concat(parts)
+
+
+def describe_error_codes(codes: pd.Series) -> pd.Series:
+    """Переводит коды ошибок в текстовые описания (для отчёта пользователю)."""
+    names = {code: describe_contact_errors(code) for code in codes.unique()}
+    return codes.map(names)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# In[ ]:
+
+
+from tkinter import ttk
+from typing import Callable, Optional
+
+VIRTUAL_BUFFER_ROWS = 50  # строк, загружаемых сверх видимых с каждой стороны
+DEFAULT_ROW_HEIGHT = 20
+HEADING_HEIGHT = 25
+
+
+class VirtualTreeview(ttk.Frame):
+    """Таблица ttk.Treeview, в которой хранятся только видимые строки.
+
+    fetch_rows(offset, limit) возвращает список пар (iid, values) начиная с
+    позиции offset, count_rows() — общее число строк. Если задан runner
+    (tasks.TaskRunner), обе функции вызываются в рабочем потоке. Строки вокруг
+    видимой области держатся в буфере, остальные подгружаются при прокрутке.
+    Содержимое таблицы обновляется сравнением с уже показанными строками,
+    а не полной очисткой.
+    """
+    def __init__(self, master, columns, fetch_rows: Callable, count_rows: Callable,
+                 runner=None, buffer: int = VIRTUAL_BUFFER_ROWS, name: str = "Загрузка строк",
+                 on_error: Optional[Callable] = None):
+        super().__init__(master)
+        self.fetch_rows = fetch_rows
+        self.count_rows = count_rows
+        self.runner = runner
+        self.buffer = buffer
+        self.name = name
+        self.on_error = on_error
+
+        self.tree = ttk.Treeview(self, columns=columns, show="headings")
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        style_height = ttk.Style(self).lookup("Treeview", "rowheight")
+        self.row_height = int(style_height) if style_height else DEFAULT_ROW_HEIGHT
+        self.total = 0
+        self.top = 0
+        self.visible = 10
+        self.cache_start = 0
+        self.cache = []
+        self.shown = {}  # iid -> значения строк, которые сейчас в таблице
+        self.generation = 0
+        self.loading = False
+        self._pending_recount = False  # число строк нужно перечитать, пока загрузка с подсчётом не завершится
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll_by(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_by(3))
+        self.tree.bind("<Prior>", lambda event: self.scroll_by(-self.visible) or "break")
+        self.tree.bind("<Next>", lambda event: self.scroll_by(self.visible) or "break")
+        self.tree.bind("<Up>", lambda event: self.on_arrow(-1))
+        self.tree.bind("<Down>", lambda event: self.on_arrow(1))
+
+    def refresh(self):
+        """Перечитывает число строк и видимую область, сохраняя позицию прокрутки."""
+        self.generation += 1
+        self._pending_recount = True
+        self._load(recount=True)
+
+    def reset(self):
+        """Перезагружает таблицу с начала (например, после смены сортировки)."""
+        self.top = 0
+        self.refresh()
+
+    def rows_added(self, count: int):
+        """Учитывает добавленные строки: меняет счётчик и перечитывает только видимую область."""
+        self.total += count
+        self.generation += 1
+        self._load(recount=False)
+
+    def rows_deleted(self, iids):
+        """Убирает удалённые строки из буфера и таблицы без перезагрузки."""
+        iids = set(iids)
+        # Загрузка, начатая до удаления, могла прочитать удалённые строки — её результат не нужен
+        self.generation += 1
+        self.cache = [row for row in self.cache if row[0] not in iids]
+        self.total = max(0, self.total - len(iids))
+        self._clamp()
+        self._update_scrollbar()
+        self._render()
+        if self.loading or not self._covers():
+            self._load(recount=False)
+
+    def rows_changed(self, iids):
+        """Перечитывает видимую область, если изменённые строки есть в буфере."""
+        cached = {row[0] for row in self.cache}
+        if any(iid in cached for iid in iids):
+            self.generation += 1
+            self._load(recount=False)
+
+    def scroll_to(self, index: int):
+        """Прокручивает таблицу так, чтобы строка index была первой видимой."""
+        self.top = index
+        self._clamp()
+        self._update_scrollbar()
+        if self._covers():
+            self._render()
+        elif not self.loading:
+            self._load(recount=False)
+
+    def scroll_by(self, rows: int):
+        """Прокручивает таблицу на заданное число строк."""
+        self.scroll_to(self.top + rows)
+
+    def on_scrollbar(self, action, amount, unit=None):
+        """Обрабатывает команды полосы прокрутки (moveto/scroll)."""
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.total))
+        elif unit == "pages":
+            self.scroll_by(int(amount) * self.visible)
+        else:
+            self.scroll_by(int(amount))
+
+    def on_mousewheel(self, event):
+        """Прокрутка колесом мыши (Windows и macOS)."""
+        self.scroll_by(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def on_arrow(self, step: int):
+        """Прокручивает таблицу, когда выделение стрелками выходит за видимую область."""
+        children = self.tree.get_children()
+        focus = self.tree.focus()
+        if not children or focus not in children:
+            return None
+        edge = children[0] if step < 0 else children[-1]
+        if focus != edge:
+            return None
+        self.scroll_by(step)
+        target = self.tree.get_children()
+        if target:
+            new_focus = target[0] if step < 0 else target[-1]
+            self.tree.focus(new_focus)
+            self.tree.selection_set(new_focus)
+        return "break"
+
+    def on_resize(self, event):
+        """Пересчитывает число видимых строк при изменении размера таблицы."""
+        visible = max(1, (event.height - HEADING_HEIGHT) // self.row_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.scroll_to(self.top)
+
+    def _clamp(self):
+        """Ограничивает позицию прокрутки допустимым диапазоном."""
+        self.top = max(0, min(self.top, self.total - self.visible))
+
+    def _covers(self) -> bool:
+        """Проверяет, что буфер содержит все видимые строки."""
+        end = min(self.total, self.top + self.visible)
+        return self.cache_start <= self.top and end <= self.cache_start + len(self.cache)
+
+    def _load(self, recount: bool):
+        """Загружает видимые строки вместе с буфером (в фоне, если задан runner).
+
+        Если подсчёт строк, запрошенный refresh(), ещё не завершился (загрузку
+        отменили или заменили новой), он выполняется и в этой загрузке.
+        """
+        recount = recount or self._pending_recount
+        generation = self.generation
+        start = max(0, self.top - self.buffer)
+        limit = self.visible + 2 * self.buffer
+        self.loading = True
+
+        def fetch(task=None):
+            total = self.count_rows() if recount else None
+            return total, self.fetch_rows(start, limit)
+
+        def done(result):
+            if generation != self.generation:
+                return  # пока строки загружались, таблицу обновили ещё раз
+            self.loading = False
+            total, rows = result
+            if total is not None:
+                self.total = total
+                self._pending_recount = False
+            if len(rows) < limit:
+                self.total = start + len(rows)  # строки кончились раньше — счётчик устарел
+            self.cache_start, self.cache = start, rows
+            self._clamp()
+            self._update_scrollbar()
+            self._render()
+            if not self._covers() and self.top < self.total:
+                self._load(recount=False)
+
+        def failed(error):
+            if generation == self.generation:
+                self.loading = False
+            if self.on_error:
+                self.on_error(error)
+
+        def cancelled():
+            if generation == self.generation:
+                self.loading = False  # следующая прокрутка загрузит строки заново
+
+        if self.runner is None:
+            done(fetch())
+        else:
+            self.runner.submit(fetch, on_success=done, on_error=failed, on_cancel=cancelled, name=self.name)
+
+    def _render(self):
+        """Показывает видимые строки из буфера, меняя только отличающиеся строки таблицы."""
+        offset = max(0, self.top - self.cache_start)
+        rows = self.cache[offset:offset + self.visible]
+        wanted = {iid for iid, _ in rows}
+
+        stale = [iid for iid in self.tree.get_children() if iid not in wanted]
+        if stale:
+            self.tree.delete(*stale)
+            for iid in stale:
+                self.shown.pop(iid, None)
+
+        for index, (iid, values) in enumerate(rows):
+            if iid not in self.shown:
+                self.tree.insert("", index, iid=iid, values=values)
+            else:
+                if self.shown[iid] != values:
+                    self.tree.item(iid, values=values)
+                if self.tree.index(iid) != index:
+                    self.tree.move(iid, "", index)
+            self.shown[iid] = values
+
+    def _update_scrollbar(self):
+        """Устанавливает положение ползунка по позиции видимой области."""
+        if self.total <= 0:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.top / self.total, min(1.0, (self.top + self.visible) / self.total))